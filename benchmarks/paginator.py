@@ -0,0 +1,74 @@
+"""Время рендера навигации по страницам в зависимости от их числа.
+
+Сравнивает includes/paginator.html с прежним циклом по page_range:
+
+    python benchmarks/paginator.py --pages 10 1000 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Прежняя разметка: по <li> на каждую страницу.
+FULL_RANGE = '''
+{% for i in page_obj.paginator.page_range %}
+  <li class="page-item">
+    <a class="page-link" href="?page={{ i }}">{{ i }}</a>
+  </li>
+{% endfor %}
+'''
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--pages', type=int, nargs='+', default=[10, 1000, 10 ** 5]
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    return parser.parse_args(argv)
+
+
+def measure(template, context, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        html = template.render(context)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(html)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(ROOT / 'yatube'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.core.paginator import Paginator
+    from django.template import Context, Template
+    from django.template.loader import get_template
+    from django.test import RequestFactory
+
+    windowed = get_template('includes/paginator.html').template
+    full_range = Template(FULL_RANGE)
+    print(f'{"страниц":>10} {"окно, мс":>10} {"байт":>8} '
+          f'{"все, мс":>10} {"байт":>10}')
+    for pages in args.pages:
+        # range не хранит элементы, так что Paginator считает len() за O(1).
+        page_obj = Paginator(range(pages), 1).page(pages // 2 or 1)
+        context = Context({
+            'request': RequestFactory().get('/', {'page': page_obj.number}),
+            'page_obj': page_obj,
+        })
+        window_ms, window_size = measure(windowed, context, args.repeat)
+        full_ms, full_size = measure(full_range, context, args.repeat)
+        print(f'{pages:>10} {window_ms:>10.2f} {window_size:>8} '
+              f'{full_ms:>10.2f} {full_size:>10}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
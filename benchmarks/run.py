@@ -0,0 +1,232 @@
+"""Бенчмарк страниц YaTube.
+
+Строит набор данных в отдельной базе, прогоняет сценарии из
+scenarios.py через тестовый клиент Django и сохраняет задержки
+(p50/p95/p99), число SQL-запросов и пропускную способность в JSON:
+
+    python benchmarks/run.py --posts 10000 --output base.json
+    python benchmarks/run.py --posts 10000 --keepdb --compare base.json
+
+С --keepdb база из --db переиспользуется, поэтому большой набор
+строится один раз.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=10 ** 4)
+    parser.add_argument('--users', type=int, help='По умолчанию posts / 10.')
+    parser.add_argument('--follows-per-user', type=int, default=20)
+    parser.add_argument('--comments-per-post', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Запросов на сценарий.')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scenario', action='append',
+                        help='Только эти сценарии; можно повторять.')
+    parser.add_argument('--cold', action='store_true',
+                        help='Очищать кеш перед каждым запросом.')
+    parser.add_argument(
+        '--db', default=str(ROOT / 'benchmarks' / 'data' / 'yatube.sqlite3')
+    )
+    parser.add_argument('--keepdb', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Файл результатов в JSON.')
+    parser.add_argument('--compare', help='JSON прошлого прогона.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Допустимый рост p95, доля.')
+    return parser.parse_args(argv)
+
+
+def setup(args):
+    sys.path.insert(0, str(ROOT / 'yatube'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    settings.DEBUG = False
+    # Бенчмарк меряет сам; семплинг middleware ему только мешает.
+    settings.REQUEST_METRICS_ENABLED = False
+    # Побочные эффекты записи уходят в очередь, как в продакшене;
+    # между сценариями её разбирает drain_tasks().
+    settings.TASKS_EAGER = False
+    setup_test_environment()
+    Path(args.db).parent.mkdir(parents=True, exist_ok=True)
+    connection.settings_dict['TEST']['NAME'] = args.db
+    connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+
+
+def ensure_dataset(args):
+    from posts import seed
+    from posts.models import Post
+
+    if Post.objects.exists():
+        print(f'Набор данных из {args.db}: {Post.objects.count()} постов')
+        return
+    started = time.perf_counter()
+    created = seed.build(
+        users=args.users or max(args.posts // 10, 10),
+        posts=args.posts,
+        follows_per_user=args.follows_per_user,
+        comments_per_post=args.comments_per_post,
+        seed=args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    print(f'Набор данных построен за {elapsed:.1f} с: {created}')
+
+
+def summarize(latencies, queries, templates, wall):
+    cuts = statistics.quantiles(
+        [latency * 1000 for latency in latencies], n=100, method='inclusive'
+    )
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(cuts[49], 2),
+        'p95_ms': round(cuts[94], 2),
+        'p99_ms': round(cuts[98], 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+        'template_ms': round(statistics.mean(templates) * 1000, 2),
+        'throughput_rps': round(len(latencies) / wall, 1),
+    }
+
+
+def run_scenario(make, args):
+    from django.core.cache import cache
+
+    from core import metrics
+
+    for _ in range(args.warmup):
+        call, url, data = make()
+        call(url, data) if data is not None else call(url)
+    latencies, queries, templates = [], [], []
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        call, url, data = make()
+        if args.cold:
+            cache.clear()
+        with metrics.record() as recorded:
+            request_started = time.perf_counter()
+            response = call(url, data) if data is not None else call(url)
+            latencies.append(time.perf_counter() - request_started)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+        queries.append(recorded.queries)
+        templates.append(recorded.template_time)
+    return summarize(
+        latencies, queries, templates, time.perf_counter() - started
+    )
+
+
+def drain_tasks():
+    from core import tasks
+
+    started = time.perf_counter()
+    done, failed = tasks.run_pending()
+    return {
+        'tasks': done + failed,
+        'failed_tasks': failed,
+        'drain_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Сценарии, где p95 вырос больше threshold или стало больше запросов."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} мс'
+            )
+        if current['max_queries'] > previous['max_queries']:
+            regressions.append(
+                f'{name}: запросов {previous["max_queries"]} -> '
+                f'{current["max_queries"]}'
+            )
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(ROOT))
+    setup(args)
+    ensure_dataset(args)
+
+    import django
+    from django.db import connection
+
+    from benchmarks.scenarios import Scenarios
+    from posts.models import Post
+
+    scenarios = Scenarios(seed=args.seed)
+    results = {}
+    for name in args.scenario or Scenarios.names:
+        results[name] = run_scenario(getattr(scenarios, name), args)
+        results[name].update(drain_tasks())
+        row = results[name]
+        print(
+            f'{name:<14} p50 {row["p50_ms"]:>8} p95 {row["p95_ms"]:>8} '
+            f'p99 {row["p99_ms"]:>8} мс  SQL {row["queries_per_request"]:>5}'
+            f'  {row["throughput_rps"]:>7} req/s'
+        )
+    report = {
+        'meta': {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'posts': Post.objects.count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    output = Path(args.output or RESULTS_DIR / (
+        datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    ))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f'Результаты: {output}')
+    if not args.keepdb:
+        connection.creation.destroy_test_db(args.db, verbosity=0)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f'Регрессия: {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Запросы, которыми бенчмарк нагружает страницы."""
+import random
+
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+LOGGED_IN_CLIENTS = 20
+
+
+class Scenarios:
+    """Готовит клиентов и по имени сценария выдаёт очередной запрос.
+
+    Профили и ленты подписок выбираются среди авторов и читателей
+    с подписками, посты - равномерно по всему диапазону id.
+    """
+    names = (
+        'index',
+        'group_posts',
+        'profile',
+        'post_detail',
+        'follow_index',
+        'post_create',
+        'add_comment',
+        'trending',
+    )
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.anonymous = Client()
+        readers = Follow.objects.values_list(
+            'user', flat=True
+        ).distinct()[:LOGGED_IN_CLIENTS]
+        self.clients = []
+        for user in User.objects.filter(pk__in=list(readers)):
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.authors = list(Post.objects.values_list(
+            'author__username', flat=True
+        ).distinct()[:1000])
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        self.post_ids = range(bounds['low'], bounds['high'] + 1)
+
+    def reader(self):
+        return self.rng.choice(self.clients)
+
+    def post_url(self, name):
+        post_id = self.rng.choice(self.post_ids)
+        return reverse(name, kwargs={'post_id': post_id})
+
+    def index(self):
+        return self.anonymous.get, reverse('posts:index'), None
+
+    def group_posts(self):
+        url = reverse(
+            'posts:group_list', kwargs={'slug': self.rng.choice(self.slugs)}
+        )
+        return self.anonymous.get, url, None
+
+    def profile(self):
+        url = reverse(
+            'posts:profile',
+            kwargs={'username': self.rng.choice(self.authors)},
+        )
+        return self.anonymous.get, url, None
+
+    def post_detail(self):
+        return self.anonymous.get, self.post_url('posts:post_detail'), None
+
+    def follow_index(self):
+        return self.reader().get, reverse('posts:follow_index'), None
+
+    def post_create(self):
+        data = {'text': f'Бенчмарк {self.rng.random()}'}
+        return self.reader().post, reverse('posts:post_create'), data
+
+    def add_comment(self):
+        data = {'text': f'Комментарий {self.rng.random()}'}
+        return self.reader().post, self.post_url('posts:add_comment'), data
+
+    def trending(self):
+        return self.anonymous.get, reverse('posts:trending'), None
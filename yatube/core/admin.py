@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+from .tasks import requeue
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'key', 'status', 'attempts', 'run_at')
+    list_filter = ('status', 'name')
+    search_fields = ('=key',)
+    readonly_fields = ('locked_by', 'locked_at', 'last_error')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        failed = queryset.filter(status=Task.FAILED)
+        for task_id in failed.values_list('pk', flat=True):
+            requeue(task_id, attempts=0, run_at=timezone.now())
+    retry.short_description = 'Повторить упавшие задачи'
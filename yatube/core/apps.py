@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.core.cache import cache
+from django.db.models.signals import post_migrate
+
+
+def clear_cache(sender, **kwargs):
+    # Кеш общий и переживает процесс: после migrate, в том числе
+    # при создании тестовой базы, в нём могут остаться объекты
+    # с чужими id и старой схемой.
+    cache.clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_cache, sender=self)
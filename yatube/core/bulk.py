@@ -0,0 +1,76 @@
+"""Массовая запись в базу порциями, мимо сигналов и save().
+
+Используется загрузкой данных (import_posts, seed_yatube) и офлайн
+расчётами вроде рекомендаций.
+"""
+import itertools
+import time
+
+from django.db import connection, transaction
+
+BATCH_SIZE = 5000
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert(model, objects, batch_size=BATCH_SIZE, report=None):
+    """bulk_create порциями по batch_size, каждая в своей транзакции."""
+    total = 0
+    started = time.monotonic()
+    for batch in batches(objects, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+        if report:
+            report(model, total, time.monotonic() - started)
+    return total
+
+
+def insert_rows(model, fields, rows, batch_size=BATCH_SIZE, report=None):
+    """Как insert(), но для кортежей значений и через executemany.
+
+    bulk_create на SQLite упирается в 999 параметров на запрос
+    и тратит на сборку SQL больше времени, чем база на вставку,
+    поэтому самые большие таблицы пишутся так. Значения должны быть
+    уже готовы для базы, даты - через db_datetime().
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(field).column) for field in fields
+    )
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))})'
+    )
+    total = 0
+    started = time.monotonic()
+    for batch in batches(rows, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        total += len(batch)
+        if report:
+            report(model, total, time.monotonic() - started)
+    return total
+
+
+def db_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def db_uuid(value):
+    if connection.features.has_native_uuid_field:
+        return value
+    return value.hex
+
+
+def analyze():
+    """Обновляет статистику планировщика после массовой загрузки."""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
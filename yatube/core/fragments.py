@@ -0,0 +1,97 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+HITS_KEY = 'fragments:hits'
+MISSES_KEY = 'fragments:misses'
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_is_shared():
+    """Видят ли другие процессы то, что этот пишет в кеш.
+
+    Без общего кеша сброс поколения в воркере или команде не доходит
+    до веб-сервера, и он отдаёт старые фрагменты.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    return backend not in PROCESS_LOCAL_BACKENDS
+
+
+def new_version():
+    # Версия от времени: после вытеснения ключа из кеша
+    # счётчик не начнёт заново с уже использованного значения.
+    return time.time_ns() // 1000
+
+
+def _generation_key(feed):
+    return f'fragments:generation:{feed}'
+
+
+def bump(*feeds):
+    """Делает устаревшими все закешированные фрагменты лент."""
+    version = new_version()
+    cache.set_many(
+        {_generation_key(feed): version for feed in feeds}, None
+    )
+
+
+def generations(feeds):
+    """Текущие поколения лент; недостающие заводятся заново."""
+    keys = {_generation_key(feed): feed for feed in feeds}
+    found = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in found}
+    for key, version in missing.items():
+        if not cache.add(key, version, None):
+            missing[key] = cache.get(key, version)
+    found.update(missing)
+    return [found[key] for key in keys]
+
+
+def fragment_key(feeds, vary_on):
+    """Ключ фрагмента: имена и поколения лент плюс vary_on."""
+    if isinstance(feeds, str):
+        feeds = [feeds]
+    parts = [*feeds, *generations(feeds), *vary_on]
+    digest = hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'fragments:{digest}'
+
+
+def _count(key):
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def load(key):
+    value = cache.get(key)
+    _count(MISSES_KEY if value is None else HITS_KEY)
+    metrics.count('cache_misses' if value is None else 'cache_hits')
+    return value
+
+
+def store(key, value):
+    cache.set(key, value, settings.FEED_CACHE_TIMEOUT)
+
+
+def stats():
+    """Счётчики попаданий и промахов кеша фрагментов."""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': counters.get(HITS_KEY, 0),
+        'misses': counters.get(MISSES_KEY, 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import fragments
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кеша фрагментов лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        if not fragments.cache_is_shared():
+            raise CommandError(
+                'Кеш в памяти процесса: счётчики веб-сервера отсюда '
+                'не видны. Настройте общий кеш в CACHES.'
+            )
+        stats = fragments.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, "
+            f'hit ratio: {ratio:.1%}'
+        )
+        if options['reset']:
+            fragments.reset_stats()
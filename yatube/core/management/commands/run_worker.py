@@ -0,0 +1,49 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = 'Разбирает очередь фоновых задач core.tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=settings.TASK_WORKER_CONCURRENCY,
+            help='Сколько задач выполнять одновременно.',
+        )
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread',
+            help='Потоки подходят для ввода-вывода, процессы - для '
+                 'тяжёлых вычислений вроде миниатюр.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.TASK_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выйти, когда готовых задач не останется.',
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+        )
+        # Текущие задачи доделываются, новые не берутся.
+        signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+        self.stdout.write(
+            f'Воркер {worker.name}: {options["concurrency"]} '
+            f'({options["pool"]})'
+        )
+        try:
+            done, failed = worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(f'Выполнено: {done}, с ошибкой: {failed}')
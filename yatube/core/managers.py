@@ -0,0 +1,91 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+from . import metrics
+from .fragments import new_version
+
+
+class CachedManager(models.Manager):
+    """Менеджер с кешированием объектов при чтении.
+
+    cached.get(pk=...) и get(<поле из lookups>=...) сначала ищут объект
+    в кеше. Ключ объекта содержит версию, которую сигналы post_save и
+    post_delete увеличивают, поэтому старая копия после правки больше
+    не читается.
+    """
+
+    def __init__(self, lookups=()):
+        super().__init__()
+        self.lookups = tuple(lookups)
+
+    @classmethod
+    def for_model(cls, model, lookups=()):
+        """Менеджер для чужой модели, например пользователя."""
+        manager = cls(lookups)
+        manager.model = model
+        manager.name = 'cached'
+        return manager
+
+    def _prefix(self):
+        return f'object:{self.model._meta.label_lower}'
+
+    def _version_key(self, pk):
+        return f'{self._prefix()}:{pk}:version'
+
+    def _object_key(self, pk, version):
+        return f'{self._prefix()}:{pk}:v{version}'
+
+    def _lookup_key(self, field, value):
+        digest = hashlib.md5(str(value).encode()).hexdigest()
+        return f'{self._prefix()}:{field}:{digest}'
+
+    def _fetch(self, pk):
+        version = cache.get_or_set(
+            self._version_key(pk), new_version, None
+        )
+        key = self._object_key(pk, version)
+        obj = cache.get(key)
+        metrics.count('cache_misses' if obj is None else 'cache_hits')
+        if obj is None:
+            obj = super().get(pk=pk)
+            cache.set(key, obj, settings.OBJECT_CACHE_TIMEOUT)
+        return obj
+
+    def get(self, *args, **kwargs):
+        if args or len(kwargs) != 1:
+            return super().get(*args, **kwargs)
+        (field, value), = kwargs.items()
+        if field in ('pk', 'id'):
+            return self._fetch(self.model._meta.pk.to_python(value))
+        if field not in self.lookups:
+            return super().get(**kwargs)
+        pk = cache.get(self._lookup_key(field, value))
+        if pk is not None:
+            try:
+                obj = self._fetch(pk)
+            except self.model.DoesNotExist:
+                obj = None
+            if obj is not None and getattr(obj, field) == value:
+                return obj
+        pk = super().values_list('pk', flat=True).get(**kwargs)
+        cache.set(
+            self._lookup_key(field, value), pk,
+            settings.OBJECT_CACHE_TIMEOUT,
+        )
+        return self._fetch(pk)
+
+    def invalidate(self, instance):
+        """Делает устаревшими все закешированные копии объекта."""
+        key = self._version_key(instance.pk)
+        if not cache.add(key, new_version(), None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, new_version(), None)
+        cache.delete_many([
+            self._lookup_key(field, getattr(instance, field))
+            for field in self.lookups
+        ])
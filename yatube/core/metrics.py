@@ -0,0 +1,83 @@
+import contextvars
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Запросы к базе, время шаблонов и счётчики одного запроса.
+
+    Экземпляр служит и обёрткой execute_wrapper для соединений с базой.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.counters = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.counters.get('cache_hits', 0),
+            'cache_misses': self.counters.get('cache_misses', 0),
+            'thumbnails': self.counters.get('thumbnails', 0),
+        }
+
+
+def count(name, value=1):
+    """Увеличивает счётчик текущего запроса, если он измеряется."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+@contextmanager
+def record():
+    """Измеряет всё, что выполняется внутри блока."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(metrics)
+                )
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def template_timer():
+    """Добавляет время блока ко времени шаблонов текущего запроса."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    # Вложенные отрисовки уже входят во время внешней.
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - started
@@ -0,0 +1,69 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Метрики запроса в заголовке Server-Timing и в логе.
+
+    Полностью измеряется доля запросов REQUEST_METRICS_SAMPLE_RATE;
+    у остальных замеряется только общее время, чтобы записать в лог
+    запросы медленнее REQUEST_METRICS_SLOW_MS. При выключенной
+    REQUEST_METRICS_ENABLED middleware не подключается вовсе.
+    Время шаблонов засекает движок core.backends.TimedDjangoTemplates.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.log(request, response, started, None)
+            return response
+        with metrics.record() as recorded:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = self.server_timing(recorded, total)
+        self.log(request, response, started, recorded)
+        return response
+
+    def server_timing(self, recorded, total):
+        data = recorded.as_dict()
+        return ', '.join([
+            f'sql;dur={data["db_ms"]};desc="{data["queries"]} queries"',
+            f'tpl;dur={data["template_ms"]}',
+            f'cache;desc="hits={data["cache_hits"]} '
+            f'misses={data["cache_misses"]}"',
+            f'thumb;desc="{data["thumbnails"]}"',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+    def log(self, request, response, started, recorded):
+        total_ms = round((time.perf_counter() - started) * 1000, 2)
+        slow = total_ms >= settings.REQUEST_METRICS_SLOW_MS
+        if recorded is None and not slow:
+            return
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': total_ms,
+            'sampled': recorded is not None,
+            **(recorded.as_dict() if recorded else {}),
+        }
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            ' '.join(f'{key}={value}' for key, value in data.items()),
+            extra={'request_metrics': data},
+        )
@@ -0,0 +1,245 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def pack_cursor(*parts):
+    """Непрозрачный токен из частей ключа сортировки."""
+    raw = '|'.join(str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def unpack_cursor(token):
+    """Части ключа из токена строками или None для битого токена."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+
+
+def encode_cursor(obj):
+    """Непрозрачный токен позиции объекта в ленте (created, id)."""
+    return pack_cursor(obj.created.isoformat(), obj.pk)
+
+
+def decode_cursor(token):
+    """Возвращает пару (created, id) или None для битого токена."""
+    try:
+        created, pk = unpack_cursor(token)
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if created is None:
+        return None
+    return created, pk
+
+
+def estimate_rows(model, using='default'):
+    """Число строк таблицы по статистике планировщика или None.
+
+    Статистику собирает ANALYZE; без неё оценки нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        # Первое число stat - строк в таблице на момент ANALYZE.
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+        ),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 появляется только после первого ANALYZE.
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без точного COUNT(*) по большим выборкам.
+
+    До PAGINATOR_EXACT_COUNT_LIMIT строк выборка считается точно
+    запросом с LIMIT. Для большей число строк берётся из подсказки
+    estimate (денормализованного счётчика, можно функцией), статистики
+    базы для таблицы без фильтров или кешированного подсчёта. Тогда
+    estimated истинно, и шаблон пишет «примерно».
+    """
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, estimate=None):
+        super().__init__(
+            object_list, per_page, orphans, allow_empty_first_page
+        )
+        self.hint = estimate
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        limit = settings.PAGINATOR_EXACT_COUNT_LIMIT
+        estimate = self.estimate()
+        if estimate is None or estimate <= limit:
+            # Читает не больше limit + 1 строк, сколько бы их ни было.
+            count = self.object_list.order_by()[:limit + 1].count()
+            if count <= limit:
+                return count
+            estimate = self.cached_count()
+        self.estimated = True
+        return estimate
+
+    def estimate(self):
+        if self.hint is not None:
+            return self.hint() if callable(self.hint) else self.hint
+        query = self.object_list.query
+        if query.where or query.distinct or not query.can_filter():
+            return None
+        return estimate_rows(self.object_list.model, self.object_list.db)
+
+    def cached_count(self):
+        """Точный COUNT(*), который повторяется не чаще раза за таймаут."""
+        digest = hashlib.md5(
+            str(self.object_list.query).encode()
+        ).hexdigest()
+        return cache.get_or_set(
+            f'paginator:count:{digest}', self.object_list.count,
+            settings.PAGINATOR_COUNT_CACHE_TIMEOUT,
+        )
+
+
+class LazyWindow:
+    """Объекты страницы, которые выбираются из базы при первом обращении.
+
+    Пока страница не нужна шаблону (например, фрагмент взят из кеша),
+    запрос к базе не выполняется.
+    """
+
+    def __init__(self, paginator):
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.paginator.window[0])
+
+    def __len__(self):
+        return len(self.paginator.window[0])
+
+    def __getitem__(self, index):
+        return self.paginator.window[0][index]
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (created, id) без COUNT(*) и OFFSET.
+
+    Страница выбирается токенами ?after= и ?before=, поэтому время
+    ответа не зависит от глубины листания.
+    """
+    cursor = True
+    key = ('created', 'id')
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page)
+        self.after = None
+        self.before = None
+
+    def encode(self, obj):
+        return encode_cursor(obj)
+
+    def decode(self, token):
+        return decode_cursor(token)
+
+    def cursor_page(self, after=None, before=None):
+        self.after = self.decode(after)
+        if self.after is None:
+            self.before = self.decode(before)
+        return Page(LazyWindow(self), 1, self)
+
+    @cached_property
+    def window(self):
+        """Объекты страницы и признаки соседних страниц."""
+        if self.after is not None:
+            items, has_next, has_previous = self._after(*self.after)
+        elif self.before is not None:
+            items, has_next, has_previous = self._before(*self.before)
+        else:
+            items, has_next, has_previous = self._after(None, None)
+        if not items and (self.after or self.before):
+            items, has_next, has_previous = self._after(None, None)
+        return items, has_next, has_previous
+
+    @property
+    def next_cursor(self):
+        items, has_next, _ = self.window
+        return self.encode(items[-1]) if items and has_next else None
+
+    @property
+    def previous_cursor(self):
+        items, _, has_previous = self.window
+        return self.encode(items[0]) if items and has_previous else None
+
+    def seek(self, queryset, created, pk, forward=True, key=None):
+        """Упорядочивает queryset по ключу и отсекает всё до курсора."""
+        date_field, id_field = key or self.key
+        lookup = 'lt' if forward else 'gt'
+        if created is not None:
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__{lookup}': created})
+                | Q(**{date_field: created, f'{id_field}__{lookup}': pk})
+            )
+        sign = '-' if forward else ''
+        return queryset.order_by(sign + date_field, sign + id_field)
+
+    def fetch(self, created, pk, forward=True):
+        """Не больше per_page + 1 объектов за курсором."""
+        queryset = self.seek(self.object_list, created, pk, forward)
+        return list(queryset[:self.per_page + 1])
+
+    def _after(self, created, pk):
+        items = self.fetch(created, pk)
+        has_next = len(items) > self.per_page
+        return items[:self.per_page], has_next, created is not None
+
+    def _before(self, created, pk):
+        items = self.fetch(created, pk, forward=False)
+        has_previous = len(items) > self.per_page
+        return items[:self.per_page][::-1], True, has_previous
+
+
+def paginate(request, queryset, per_page=None,
+             paginator_class=CursorPaginator, estimate=None, **kwargs):
+    """Страница ленты: по курсору, либо по номеру при явном ?page=.
+
+    estimate - число объектов или функция, его возвращающая,
+    для EstimatedCountPaginator в режиме номеров.
+    """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        paginator = EstimatedCountPaginator(
+            queryset, per_page, estimate=estimate
+        )
+        return paginator.get_page(page_number)
+    paginator = paginator_class(queryset, per_page, **kwargs)
+    return paginator.cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
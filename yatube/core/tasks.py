@@ -0,0 +1,266 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача - функция с декоратором @task. task.delay(*args, key=...)
+добавляет строку Task в текущей транзакции, так что задача видна
+воркеру только после коммита и пропадает при откате. Очередь
+разбирает manage.py run_worker. При TASKS_EAGER задача выполняется
+сразу, в том же процессе; иначе воркеру нужен общий с сервером кеш.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (
+    IntegrityError, OperationalError, connection, connections, transaction
+)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import fragments
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """Регистрирует функцию как задачу и добавляет ей метод delay.
+
+    Аргументы задачи должны сериализоваться в JSON, а сама она -
+    переживать повторный запуск: после сбоя она выполняется снова.
+    """
+    if func is None:
+        return partial(task, max_attempts=max_attempts)
+    name = f'{func.__module__}.{func.__qualname__}'
+    registry[name] = func
+    func.task_name = name
+    func.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+    func.delay = partial(enqueue, func)
+    return func
+
+
+def resolve(name):
+    if name not in registry:
+        # Импорт модуля регистрирует его задачи.
+        import_string(name)
+    return registry[name]
+
+
+def enqueue(func, *args, key=None, countdown=0, **kwargs):
+    """Ставит задачу в очередь; задача с тем же key, ещё ждущая
+    своей очереди, не дублируется."""
+    if settings.TASKS_EAGER:
+        func(*args, **kwargs)
+        return
+    Task.objects.bulk_create([
+        Task(
+            name=func.task_name,
+            payload=json.dumps({'args': args, 'kwargs': kwargs}),
+            key=key,
+            max_attempts=func.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+        )
+    ], ignore_conflicts=True)
+
+
+def backoff(attempt):
+    """Пауза перед повтором: экспоненциальная, со случайной
+    добавкой, чтобы упавшие вместе задачи не повторялись разом."""
+    delay = min(
+        settings.TASK_RETRY_BACKOFF * 2 ** (attempt - 1),
+        settings.TASK_RETRY_BACKOFF_MAX,
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def requeue(task_id, **fields):
+    """Возвращает задачу в очередь; если там уже есть задача
+    с тем же ключом, эта не нужна."""
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task_id).update(
+                status=Task.PENDING, locked_by='', locked_at=None, **fields
+            )
+    except IntegrityError:
+        Task.objects.filter(pk=task_id).delete()
+
+
+def release_stale():
+    """Возвращает в очередь задачи воркеров, которые упали,
+    не успев их закончить."""
+    deadline = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    stale = Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=deadline
+    ).values_list('pk', flat=True)
+    for task_id in list(stale):
+        requeue(task_id)
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач для воркера worker.
+
+    Задачи помечаются одним условным UPDATE, без отдельного SELECT
+    в транзакции: на SQLite переход от чтения к записи внутри
+    транзакции конфликтует с другими писателями и сразу падает
+    с «database is locked», а одиночный UPDATE ждёт блокировку.
+    """
+    now = timezone.now()
+    ready = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=now
+    ).order_by('run_at')
+    if connection.features.has_select_for_update_skip_locked:
+        ready = ready.select_for_update(skip_locked=True)
+    with transaction.atomic():
+        Task.objects.filter(
+            pk__in=ready.values('pk')[:limit], status=Task.PENDING
+        ).update(
+            status=Task.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(Task.objects.filter(
+        status=Task.RUNNING, locked_by=worker, locked_at=now
+    ))
+
+
+def execute(task_id):
+    """Выполняет взятую задачу: удаляет её при успехе, при ошибке
+    откладывает повтор или помечает failed."""
+    task = Task.objects.filter(pk=task_id).first()
+    if task is None:
+        return True
+    payload = json.loads(task.payload)
+    try:
+        resolve(task.name)(*payload['args'], **payload['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            logger.error('Задача %s не выполнена: %s', task, error)
+            Task.objects.filter(pk=task_id).update(
+                status=Task.FAILED, last_error=error
+            )
+            return False
+        logger.warning('Задача %s упала, повтор: %s', task, error)
+        requeue(task_id, last_error=error, run_at=(
+            timezone.now() + timedelta(seconds=backoff(task.attempts))
+        ))
+        return False
+    Task.objects.filter(pk=task_id).delete()
+    return True
+
+
+def _execute_in_worker(task_id):
+    try:
+        return execute(task_id)
+    finally:
+        # Потоки и процессы пула держат свои соединения.
+        connection.close()
+
+
+class Worker:
+    """Разбирает очередь в пуле из concurrency потоков или процессов."""
+
+    def __init__(self, concurrency=None, pool='thread', poll_interval=None,
+                 name=None):
+        if not settings.TASKS_EAGER and not fragments.cache_is_shared():
+            # Задачи сбрасывают кеш лент и графа; в кеше своего
+            # процесса сервер этого не увидит.
+            raise ImproperlyConfigured(
+                'Воркеру нужен общий кеш: '
+                f'{settings.CACHES["default"]["BACKEND"]} виден '
+                'только своему процессу.'
+            )
+        self.concurrency = concurrency or settings.TASK_WORKER_CONCURRENCY
+        self.pool = pool
+        self.poll_interval = poll_interval or settings.TASK_POLL_INTERVAL
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopped = False
+
+    def executor(self):
+        if self.pool == 'process':
+            executor = ProcessPoolExecutor(self.concurrency)
+            # Дочерние процессы не должны делить соединение родителя.
+            # Пул с fork запускает все процессы при первой задаче,
+            # поэтому закрываем соединения и сразу отдаём ему пустую
+            # задачу, пока claim() не открыл соединение снова.
+            connections.close_all()
+            executor.submit(int).result()
+            return executor
+        return ThreadPoolExecutor(
+            self.concurrency, thread_name_prefix='tasks'
+        )
+
+    def run(self, once=False):
+        """Работает до stop(); с once - пока в очереди есть готовые
+        задачи. Возвращает число выполненных и упавших задач."""
+        done = failed = 0
+        running = set()
+        with self.executor() as executor:
+            while not self.stopped:
+                try:
+                    release_stale()
+                    free = self.concurrency - len(running)
+                    claimed = claim(self.name, free) if free else []
+                except OperationalError as error:
+                    # База занята другими писателями: пробуем снова
+                    # на следующем круге, а не роняем воркер.
+                    logger.warning('Очередь недоступна: %s', error)
+                    time.sleep(self.poll_interval)
+                    continue
+                running.update(
+                    executor.submit(_execute_in_worker, item.pk)
+                    for item in claimed
+                )
+                if not running:
+                    if once:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                finished, running = wait(
+                    running, self.poll_interval, return_when=FIRST_COMPLETED
+                )
+                for future in finished:
+                    try:
+                        ok = future.result()
+                    except OperationalError as error:
+                        # Задача останется running и вернётся в очередь
+                        # через TASK_LOCK_TIMEOUT.
+                        logger.warning('Задача не завершена: %s', error)
+                        ok = False
+                    if ok:
+                        done += 1
+                    else:
+                        failed += 1
+        return done, failed
+
+    def stop(self):
+        self.stopped = True
+
+
+def run_pending():
+    """Выполняет все готовые задачи в текущем потоке."""
+    worker = Worker(concurrency=1)
+    done = failed = 0
+    while True:
+        claimed = claim(worker.name, 100)
+        if not claimed:
+            return done, failed
+        for item in claimed:
+            if execute(item.pk):
+                done += 1
+            else:
+                failed += 1
@@ -0,0 +1,44 @@
+from django import template
+
+from core import fragments
+
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, feeds, vary_on):
+        self.nodelist = nodelist
+        self.feeds = feeds
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = fragments.fragment_key(
+            self.feeds.resolve(context),
+            [var.resolve(context) for var in self.vary_on],
+        )
+        value = fragments.load(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            fragments.store(key, value)
+        return value
+
+
+@register.tag
+def feedcache(parser, token):
+    """Кеширует фрагмент ленты до следующего изменения её поколения.
+
+    {% feedcache feed [vary_on ...] %}...{% endfeedcache %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 1 argument."
+        )
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
@@ -0,0 +1,42 @@
+from django import template
+
+
+register = template.Library()
+
+CURSOR_PARAMS = ('page', 'after', 'before')
+
+
+@register.simple_tag(takes_context=True)
+def querystring(context, **params):
+    """Текущие GET-параметры без позиции страницы, плюс params."""
+    query = context['request'].GET.copy()
+    for name in CURSOR_PARAMS:
+        query.pop(name, None)
+    for name, value in params.items():
+        query[name] = value
+    return query.urlencode()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    """Номера страниц для навигации: on_ends первых и последних
+    и on_each_side вокруг текущей; None на месте пропуска.
+
+    Длина списка не зависит от числа страниц.
+    """
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    shown = {
+        *range(1, on_ends + 1),
+        *range(number - on_each_side, number + on_each_side + 1),
+        *range(num_pages - on_ends + 1, num_pages + 1),
+    }
+    window = []
+    for page in sorted(page for page in shown if 1 <= page <= num_pages):
+        if window and page - window[-1] == 2:
+            # Пропуск в одну страницу проще показать самой страницей.
+            window.append(page - 1)
+        elif window and page - window[-1] > 2:
+            window.append(None)
+        window.append(page)
+    return window
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+
+from .. import fragments
+
+
+class FeedCacheStatsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_visible_from_another_process(self):
+        """feed_cache_stats в отдельном процессе видит счётчики сервера."""
+        key = fragments.fragment_key('index', [])
+        fragments.load(key)
+        fragments.store(key, 'html')
+        fragments.load(key)
+        output = subprocess.run(
+            [sys.executable, 'manage.py', 'feed_cache_stats'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True,
+        ).stdout
+        self.assertIn('hits: 1, misses: 1', output)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_process_local_cache_rejected(self):
+        """С кешем в памяти процесса команда не выдаёт пустые нули."""
+        with self.assertRaises(CommandError):
+            call_command('feed_cache_stats')
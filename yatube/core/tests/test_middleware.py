@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template import engines
+from django.template.base import Template
+from django.test import TestCase, override_settings
+
+from .. import metrics
+from ..middleware import ServerTimingMiddleware
+
+
+class ServerTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+    def test_sampled_request_reports_metrics(self):
+        """Измеренный запрос отдаёт Server-Timing и пишет строку в лог."""
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get('/')
+        header = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            self.assertIn(metric, header)
+        record = logs.records[0]
+        self.assertTrue(record.request_metrics['sampled'])
+        self.assertGreater(record.request_metrics['queries'], 0)
+        self.assertGreater(record.request_metrics['template_ms'], 0)
+        self.assertEqual(record.request_metrics['cache_misses'], 1)
+
+    @override_settings(
+        REQUEST_METRICS_SAMPLE_RATE=0, REQUEST_METRICS_SLOW_MS=0
+    )
+    def test_slow_request_logged_without_sampling(self):
+        """Медленный запрос попадает в лог, даже если не измерялся."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = self.client.get('/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertFalse(logs.records[0].request_metrics['sampled'])
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_middleware_is_not_used(self):
+        """Выключенная middleware убирается из цепочки."""
+        with self.assertRaises(MiddlewareNotUsed):
+            ServerTimingMiddleware(lambda request: HttpResponse())
+
+    def test_template_timing_does_not_patch_django(self):
+        """Время шаблонов меряет движок, а не подмена Template.render."""
+        render = Template.render
+        ServerTimingMiddleware(lambda request: HttpResponse())
+        self.assertIs(Template.render, render)
+        template = engines['django'].from_string('{{ value }}')
+        with metrics.record() as recorded:
+            self.assertEqual(template.render({'value': 'ok'}), 'ok')
+        self.assertGreater(recorded.template_time, 0)
@@ -0,0 +1,68 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from ..paginator import EstimatedCountPaginator, estimate_rows
+
+User = get_user_model()
+
+
+@override_settings(PAGINATOR_EXACT_COUNT_LIMIT=4)
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(6):
+            User.objects.create_user(username=f'user{i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self, queryset=None, **kwargs):
+        return EstimatedCountPaginator(
+            (User.objects.all() if queryset is None else queryset)
+            .order_by('pk'),
+            2, **kwargs
+        )
+
+    def test_small_set_counted_exactly(self):
+        """Выборка не больше порога считается точно."""
+        paginator = self.paginator(User.objects.filter(username__lt='user3'))
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.estimated)
+
+    def test_hint_used_for_large_set(self):
+        """Подсказка-счётчик заменяет COUNT(*) для большой выборки."""
+        paginator = self.paginator(estimate=lambda: 1000)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 500)
+        self.assertTrue(paginator.estimated)
+
+    def test_stale_hint_falls_back_to_cached_count(self):
+        """Заниженная подсказка не прячет строки: счёт из кеша."""
+        self.assertEqual(self.paginator(estimate=1).count, 6)
+        User.objects.create_user(username='late')
+        paginator = self.paginator(estimate=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 6)
+        self.assertTrue(paginator.estimated)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Статистика sqlite_stat1')
+    def test_table_statistics(self):
+        """Нефильтрованная таблица оценивается по статистике ANALYZE."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                'UPDATE sqlite_stat1 SET stat = %s WHERE tbl = %s',
+                ['50000 1', User._meta.db_table],
+            )
+        paginator = self.paginator()
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 50000)
+        filtered = self.paginator(User.objects.filter(username='user1'))
+        self.assertEqual(filtered.count, 1)
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM sqlite_stat1')
+        self.assertIsNone(estimate_rows(User))
@@ -0,0 +1,156 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .. import fragments, tasks
+from ..models import Task
+
+User = get_user_model()
+
+calls = []
+
+
+@tasks.task
+def remember(value):
+    calls.append(value)
+
+
+@tasks.task
+def create_user(username):
+    User.objects.create_user(username=username)
+
+
+@tasks.task
+def bump_index():
+    fragments.bump('index')
+
+
+@tasks.task(max_attempts=2)
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError('Сбой')
+
+
+@override_settings(TASKS_EAGER=False, TASK_RETRY_BACKOFF=60)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_immediately(self):
+        """В режиме TASKS_EAGER задача выполняется сразу."""
+        remember.delay(1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_queued_task_runs_and_is_deleted(self):
+        """Задача ждёт воркера и удаляется после выполнения."""
+        remember.delay('a', key='k')
+        self.assertEqual(calls, [])
+        self.assertEqual(tasks.run_pending(), (1, 0))
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_pending_key_is_not_duplicated(self):
+        """Вторая задача с ключом, ждущим очереди, не добавляется."""
+        remember.delay(1, key='same')
+        remember.delay(2, key='same')
+        remember.delay(3, key='other')
+        remember.delay(4)
+        self.assertEqual(Task.objects.count(), 3)
+
+    def test_failed_task_retried_with_backoff(self):
+        """Упавшая задача откладывается и затем повторяется."""
+        flaky.delay(1)
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_pending(), (0, 1))
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('Сбой', task.last_error)
+        self.assertGreater(
+            task.run_at, timezone.now() + timedelta(seconds=29)
+        )
+        self.assertEqual(tasks.run_pending(), (0, 0))
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(tasks.run_pending(), (1, 0))
+        self.assertFalse(Task.objects.exists())
+
+    def test_gives_up_after_max_attempts(self):
+        """После max_attempts задача остаётся со статусом failed."""
+        flaky.delay(5)
+        with self.assertLogs('core.tasks', 'WARNING') as logs:
+            for _ in range(2):
+                Task.objects.update(run_at=timezone.now())
+                tasks.run_pending()
+        self.assertEqual(logs.records[-1].levelname, 'ERROR')
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_stale_running_task_released(self):
+        """Задача упавшего воркера возвращается в очередь."""
+        remember.delay(1)
+        tasks.claim('dead', 1)
+        Task.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+        tasks.release_stale()
+        self.assertEqual(Task.objects.get().status, Task.PENDING)
+
+
+@override_settings(TASKS_EAGER=False)
+class RunWorkerTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_drains_queue(self):
+        """run_worker --once выполняет задачи в пуле."""
+        for i in range(5):
+            remember.delay(i)
+        out = StringIO()
+        call_command('run_worker', '--once', '--concurrency=2', stdout=out)
+        self.assertIn('Выполнено: 5, с ошибкой: 0', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(5)))
+        self.assertFalse(Task.objects.exists())
+
+    def test_concurrent_writers(self):
+        """Пулы потоков и процессов пишут в базу параллельно
+        и не падают на блокировках SQLite."""
+        for pool in ('thread', 'process'):
+            with self.subTest(pool=pool):
+                for i in range(20):
+                    create_user.delay(f'{pool}{i}')
+                worker = tasks.Worker(concurrency=4, pool=pool)
+                self.assertEqual(worker.run(once=True), (20, 0))
+                self.assertEqual(
+                    User.objects.filter(username__startswith=pool).count(),
+                    20,
+                )
+                self.assertFalse(Task.objects.exists())
+
+    def test_invalidation_visible_from_worker_process(self):
+        """Сброс кеша в процессе пула виден процессу сервера."""
+        cache.clear()
+        key = fragments.fragment_key('index', [])
+        fragments.store(key, 'html')
+        bump_index.delay()
+        worker = tasks.Worker(concurrency=1, pool='process')
+        self.assertEqual(worker.run(once=True), (1, 0))
+        self.assertNotEqual(fragments.fragment_key('index', []), key)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_process_local_cache_rejected(self):
+        """Без общего кеша воркер не запускается."""
+        with self.assertRaises(ImproperlyConfigured):
+            tasks.Worker()
+        with self.settings(TASKS_EAGER=True):
+            tasks.Worker()
@@ -0,0 +1,43 @@
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase
+
+from ..templatetags.pagination import page_window
+
+
+class PageWindowTests(SimpleTestCase):
+    def window(self, number, num_pages):
+        paginator = Paginator(range(num_pages), 1)
+        return page_window(paginator.page(number))
+
+    def test_window_around_current_page(self):
+        """Первая, последняя и по две соседние страницы с пропусками."""
+        self.assertEqual(
+            self.window(50, 100), [1, None, 48, 49, 50, 51, 52, None, 100]
+        )
+        self.assertEqual(self.window(1, 100), [1, 2, 3, None, 100])
+        self.assertEqual(self.window(100, 100), [1, None, 98, 99, 100])
+
+    def test_single_page_gap_filled(self):
+        """Вместо пропуска в одну страницу выводится она сама."""
+        self.assertEqual(self.window(4, 10), [1, 2, 3, 4, 5, 6, None, 10])
+        self.assertEqual(self.window(2, 3), [1, 2, 3])
+
+    def test_length_does_not_depend_on_num_pages(self):
+        """Для миллиона страниц ссылок столько же, сколько для сотни."""
+        self.assertEqual(
+            len(self.window(500000, 10 ** 6)), len(self.window(50, 100))
+        )
+
+    def test_template_keeps_query_params(self):
+        """Ссылки на страницы сохраняют остальные GET-параметры."""
+        request = RequestFactory().get('/', {'q': 'котики', 'page': 5})
+        page_obj = Paginator(range(100), 10).page(5)
+        html = Template(
+            "{% include 'includes/paginator.html' %}"
+        ).render(Context({'request': request, 'page_obj': page_obj}))
+        self.assertIn(
+            'q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA%D0%B8&amp;page=6', html
+        )
+        # Предыдущая, 1-7, пропуск, 10, следующая.
+        self.assertEqual(html.count('class="page-item'), 11)
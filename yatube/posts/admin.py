@@ -1,9 +1,132 @@
+import datetime
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.db.models import Max, Min, Q, QuerySet
+from django.utils import timezone
+
+from core.paginator import EstimatedCountPaginator
 
+from . import export
 from .models import Post, Group, Comment, Follow
+from .search import get_backend
+
+
+def _local_date(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).date()
+    return value
+
+
+def _user_id(username):
+    return get_user_model().objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+
+
+def _next_date(date, kind):
+    if kind == 'year':
+        return date.replace(year=date.year + 1)
+    if kind == 'month':
+        return date.replace(
+            year=date.year + date.month // 12, month=date.month % 12 + 1
+        )
+    return date + datetime.timedelta(days=1)
+
+
+class RangeDatesQuerySet(QuerySet):
+    """dates() по MIN и MAX поля вместо DISTINCT по всем строкам.
+
+    date_hierarchy тогда читает две строки индекса, а не всю таблицу;
+    в диапазоне могут попасться пустые месяцы и дни.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        date = _local_date(bounds['first'])
+        last = _local_date(bounds['last'])
+        if kind == 'year':
+            date = date.replace(month=1, day=1)
+        elif kind == 'month':
+            date = date.replace(day=1)
+        dates = []
+        while date <= last:
+            dates.append(date)
+            date = _next_date(date, kind)
+        return dates[::-1] if order == 'DESC' else dates
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которое подписывает выбранный объект уже
+    загруженным экземпляром, а не отдельным запросом."""
+    selected = None
 
+    def optgroups(self, name, value, attr=None):
+        values = {str(v) for v in value if v not in (None, '')}
+        if self.selected is None or values != {str(self.selected.pk)}:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        label = self.choices.field.label_from_instance(self.selected)
+        options.append(self.create_option(
+            name, self.selected.pk, label, True, len(options)
+        ))
+        return [(None, options, 0)]
 
-class PostAdmin(admin.ModelAdmin):
+
+class PreloadedRelationsForm(forms.ModelForm):
+    """Форма строки списка: подписи в автодополнении берутся
+    из связей, загруженных list_select_related."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if not isinstance(widget, PreloadedAutocompleteSelect):
+                continue
+            relation = self.instance._meta.get_field(name)
+            if relation.is_cached(self.instance):
+                widget.selected = relation.get_cached_value(self.instance)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) и DISTINCT по всей таблице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Как ModelAdmin.get_queryset, но с dates() по MIN и MAX.
+        queryset = RangeDatesQuerySet(
+            self.model, using=self.model._default_manager.db
+        )
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'),
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        # Иначе каждая строка list_editable отдельным запросом ищет
+        # подпись своего значения в автодополнении.
+        kwargs.setdefault('form', PreloadedRelationsForm)
+        return super().get_changelist_form(request, **kwargs)
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,9 +135,31 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    # Поле выбора подгружает варианты поиском, а не рисует все группы
+    # в каждой строке.
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
+    # Фильтр по дате не читает таблицу, а date_hierarchy - см.
+    # RangeDatesQuerySet.
     list_filter = ('created',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
+    actions = ('export_csv', 'export_ndjson')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тому же индексу, что и /search/, вместо LIKE '%...%'.
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
+    def export_csv(self, request, queryset):
+        return export.response(queryset, 'csv')
+    export_csv.short_description = 'Выгрузить в CSV'
+
+    def export_ndjson(self, request, queryset):
+        return export.response(queryset, 'ndjson')
+    export_ndjson.short_description = 'Выгрузить в NDJSON'
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -28,14 +173,48 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('post', 'author', 'text')
-    search_fields = ('post', 'author', 'text')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    # Только для поля поиска, см. get_search_results.
+    search_fields = ('=author__username', '=post__id')
+    # Порядок по pk совпадает с порядком по дате и не требует сортировки.
+    ordering = ('-pk',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Автор по id из username и пост по числу - без JOIN с
+        # пользователями и LIKE по тексту комментариев.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q(pk__in=[])
+        if term.isdigit():
+            condition |= Q(post_id=int(term))
+        author_id = _user_id(term)
+        if author_id is not None:
+            condition |= Q(author_id=author_id)
+        return queryset.filter(condition), False
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
-    search_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    ordering = ('-pk',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Подписки и подписчики по id из username, без JOIN с
+        # пользователями.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        user_id = _user_id(term)
+        if user_id is None:
+            return queryset.none(), False
+        condition = Q(user_id=user_id) | Q(author_id=user_id)
+        return queryset.filter(condition), False
 
 
 admin.site.register(Post, PostAdmin)
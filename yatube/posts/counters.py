@@ -0,0 +1,122 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from core import bulk
+
+from . import timeline
+from .models import AuthorStats, Comment, Follow, Post, User
+
+# Порция строк для recount(): заводим AuthorStats и правим comment_count.
+BATCH_SIZE = 1000
+
+
+def update_author(user_id, **deltas):
+    """Атомарно сдвигает счётчики автора: update_author(1, posts_count=1)."""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if AuthorStats.objects.filter(user_id=user_id).update(**updates):
+        return
+    # Строки нет: заводим её при росте счётчиков, но не при удалении,
+    # когда сам пользователь может удаляться в этой же транзакции.
+    if all(delta > 0 for delta in deltas.values()):
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        AuthorStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def update_authors(user_ids, **deltas):
+    """Как update_author, но для многих авторов одним UPDATE."""
+    if all(delta > 0 for delta in deltas.values()):
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+    AuthorStats.objects.filter(user_id__in=user_ids).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def update_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+    Post.cached.invalidate(Post(pk=post_id))
+
+
+def _count(queryset, field, outer='pk'):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def _author_counts():
+    return {
+        'posts_count': _count(Post.objects, 'author', 'user'),
+        'followers_count': _count(Follow.objects, 'author', 'user'),
+        'following_count': _count(Follow.objects, 'user', 'user'),
+    }
+
+
+def _create_stats(user_ids):
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def recount():
+    """Пересчитывает все счётчики с нуля, исправляя расхождения."""
+    users = User.objects.values_list('pk', flat=True)
+    for batch in bulk.batches(users.iterator(), BATCH_SIZE):
+        _create_stats(batch)
+    # Посты обходятся по pk порциями; переписываются только
+    # разошедшиеся, и их копии в кеше сбрасываются, иначе Post.cached
+    # продолжит отдавать старый comment_count.
+    comment_count = _count(Comment.objects, 'post')
+    last_id = 0
+    while True:
+        ids = list(Post.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        drifted = list(
+            Post.objects.filter(pk__gt=last_id, pk__lte=ids[-1])
+            .annotate(actual=comment_count)
+            .exclude(comment_count=F('actual'))
+            .values_list('pk', flat=True)
+        )
+        last_id = ids[-1]
+        if not drifted:
+            continue
+        Post.objects.filter(pk__in=drifted).update(
+            comment_count=comment_count
+        )
+        for post_id in drifted:
+            Post.cached.invalidate(Post(pk=post_id))
+    AuthorStats.objects.update(**_author_counts())
+    timeline.forget_celebrities()
+
+
+def recount_authors(user_ids):
+    """Как recount(), но только для счётчиков этих пользователей."""
+    for batch in bulk.batches(user_ids, BATCH_SIZE):
+        _create_stats(batch)
+        AuthorStats.objects.filter(user_id__in=batch).update(
+            **_author_counts()
+        )
+    timeline.forget_celebrities()
+
+
+def recount_posts(post_ids):
+    """Как recount(), но только для comment_count этих постов."""
+    comment_count = _count(Comment.objects, 'post')
+    for batch in bulk.batches(post_ids, BATCH_SIZE):
+        Post.objects.filter(pk__in=batch).update(comment_count=comment_count)
+        for post_id in batch:
+            Post.cached.invalidate(Post(pk=post_id))
@@ -0,0 +1,37 @@
+from core import fragments
+
+INDEX = 'index'
+CELEBRITIES = 'follow:celebrities'
+TRENDING = 'trending'
+
+
+def group(group_id):
+    return f'group:{group_id}'
+
+
+def author(author_id):
+    return f'author:{author_id}'
+
+
+def follow(user_id):
+    return f'follow:{user_id}'
+
+
+def bump_post(post, *group_ids):
+    """Обновляет поколения общих лент, в которые входит пост."""
+    group_ids = {post.group_id, *group_ids} - {None}
+    fragments.bump(
+        INDEX,
+        author(post.author_id),
+        *(group(group_id) for group_id in group_ids),
+    )
+
+
+def bump_author(author_id, group_ids):
+    """Обновляет общие ленты с карточками постов автора."""
+    fragments.bump(
+        INDEX,
+        TRENDING,
+        author(author_id),
+        *(group(group_id) for group_id in group_ids),
+    )
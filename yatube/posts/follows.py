@@ -0,0 +1,100 @@
+"""Подписка и отписка на многих авторов за один запрос.
+
+bulk_create и удаление без сигналов не трогают счётчики, ленты
+и граф, поэтому они обновляются здесь один раз на всю пачку,
+а не по сигналу на каждую строку.
+"""
+from django.db import transaction
+
+from . import counters, graph, signals, tasks, timeline
+from .models import AuthorStats, Follow, User
+
+FOLLOWED = 'followed'
+ALREADY_FOLLOWING = 'already_following'
+UNFOLLOWED = 'unfollowed'
+NOT_FOLLOWING = 'not_following'
+SELF = 'self'
+NOT_FOUND = 'not_found'
+
+
+def resolve(user, usernames):
+    """Имена авторов в id одним запросом IN.
+
+    Возвращает результаты в порядке usernames, где уже отмечены
+    ненайденные и сам user, и {username: id} остальных.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    found = dict(User.objects.filter(
+        username__in=usernames
+    ).values_list('username', 'id'))
+    results, authors = {}, {}
+    for name in usernames:
+        if name not in found:
+            results[name] = NOT_FOUND
+        elif found[name] == user.pk:
+            results[name] = SELF
+        else:
+            results[name] = None
+            authors[name] = found[name]
+    return results, authors
+
+
+def _followed(user, author_ids):
+    return set(Follow.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def follow_many(user, usernames):
+    """Подписывает user на авторов; возвращает {username: статус}."""
+    results, authors = resolve(user, usernames)
+    with transaction.atomic():
+        # Строка счётчиков подписчика блокируется до конца транзакции:
+        # параллельная подписка того же пользователя ждёт её, поэтому
+        # new - ровно те строки, что вставит bulk_create, и счётчики
+        # не уплывают из-за пропущенных ignore_conflicts конфликтов.
+        list(AuthorStats.objects.select_for_update().filter(
+            user=user
+        ).values_list('pk'))
+        existing = _followed(user, authors.values())
+        new = [pk for pk in authors.values() if pk not in existing]
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=pk) for pk in new],
+            ignore_conflicts=True,
+        )
+        if new:
+            counters.update_authors(new, followers_count=1)
+            counters.update_author(user.pk, following_count=len(new))
+            if timeline.new_celebrities(new):
+                timeline.forget_celebrities()
+    for name, pk in authors.items():
+        results[name] = ALREADY_FOLLOWING if pk in existing else FOLLOWED
+    graph.update(user.pk, added=new)
+    if new:
+        # Посты всех новых авторов могут исчисляться тысячами.
+        tasks.backfill_timeline.delay(user.pk, new)
+    return results
+
+
+def unfollow_many(user, usernames):
+    """Отписывает user от авторов; возвращает {username: статус}."""
+    results, authors = resolve(user, usernames)
+    with transaction.atomic():
+        # Как в follow_many: existing - ровно те строки, что удалятся.
+        list(AuthorStats.objects.select_for_update().filter(
+            user=user
+        ).values_list('pk'))
+        existing = list(_followed(user, authors.values()))
+        if existing:
+            rows = Follow.objects.filter(user=user, author_id__in=existing)
+            rows._raw_delete(rows.db)
+            timeline.trim(user.pk, *existing)
+            counters.update_authors(existing, followers_count=-1)
+            counters.update_author(
+                user.pk, following_count=-len(existing)
+            )
+            signals.fan_out_former_celebrities(existing)
+    for name, pk in authors.items():
+        results[name] = UNFOLLOWED if pk in existing else NOT_FOLLOWING
+    graph.update(user.pk, removed=existing)
+    return results
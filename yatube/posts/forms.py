@@ -1,4 +1,7 @@
+import re
+
 from django import forms
+from django.conf import settings
 
 from .models import Post, Comment
 
@@ -19,3 +22,20 @@ class CommentForm(forms.ModelForm):
         model = Comment
         fields = ('text',)
         help_texts = {'text': 'Напишите комментарий'}
+
+
+class BulkFollowForm(forms.Form):
+    usernames = forms.CharField(
+        widget=forms.Textarea,
+        help_text='Имена авторов через пробел, запятую или с новой строки',
+    )
+
+    def clean_usernames(self):
+        usernames = list(dict.fromkeys(
+            re.split(r'[\s,]+', self.cleaned_data['usernames'].strip())
+        ))
+        if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+            raise forms.ValidationError(
+                f'Не больше {settings.FOLLOW_BULK_LIMIT} авторов за раз.'
+            )
+        return usernames
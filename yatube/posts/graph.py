@@ -0,0 +1,139 @@
+"""Граф подписок в памяти.
+
+Для каждого пользователя хранится отсортированный массив array('I')
+с id тех, на кого он подписан. Массивы лежат в общем кеше и в кеше
+процесса; версия в общем кеше говорит процессу, что его копия
+устарела. Подписка и отписка правят массив только подписчика,
+остальные не сбрасываются.
+
+Возвращаемые массивы общие для всех читателей, менять их нельзя.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+
+class LocalCache:
+    """Кеш процесса на size последних массивов."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.FOLLOW_GRAPH_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+local = LocalCache()
+
+
+def _version_key(user_id):
+    return f'graph:following:{user_id}'
+
+
+def _data_key(user_id, version):
+    return f'graph:following:{user_id}:{version}'
+
+
+def _from_db(user_id):
+    return array('I', Follow.objects.filter(
+        user_id=user_id
+    ).order_by('author_id').values_list('author_id', flat=True))
+
+
+def store(user_id, ids):
+    """Кладёт массив в оба кеша под новой версией."""
+    version = time.time_ns()
+    timeout = settings.FOLLOW_GRAPH_TIMEOUT
+    cache.set(_data_key(user_id, version), ids.tobytes(), timeout)
+    cache.set(_version_key(user_id), version, timeout)
+    local.set(user_id, (version, ids))
+    return ids
+
+
+def cached(user_id):
+    """Массив из кеша без обращения к базе; None, если его там нет."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        return None
+    entry = local.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    data = cache.get(_data_key(user_id, version))
+    if data is None:
+        return None
+    ids = array('I')
+    ids.frombytes(data)
+    local.set(user_id, (version, ids))
+    return ids
+
+
+def following(user_id):
+    """Отсортированные id авторов, на которых подписан user_id."""
+    ids = cached(user_id)
+    if ids is None:
+        ids = store(user_id, _from_db(user_id))
+    return ids
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id, author_id):
+    return contains(following(user_id), author_id)
+
+
+def update(user_id, added=(), removed=()):
+    """Правит граф после подписки user_id на added и отписки от removed."""
+    ids = cached(user_id)
+    if ids is None:
+        # В кеше нет - следующее чтение возьмёт массив из базы.
+        return
+    # Копия и вставки через bisect: пересортировывать весь массив
+    # на каждую подписку незачем.
+    ids = ids[:]
+    for value in added:
+        index = bisect_left(ids, value)
+        if index == len(ids) or ids[index] != value:
+            ids.insert(index, value)
+    for value in removed:
+        index = bisect_left(ids, value)
+        if index < len(ids) and ids[index] == value:
+            del ids[index]
+    store(user_id, ids)
+
+
+def reset(user_id):
+    """Пустой массив нового пользователя: запрашивать базу незачем."""
+    store(user_id, array('I'))
+
+
+def forget(*user_ids):
+    """Сбрасывает массивы пользователей, например после bulk_create."""
+    cache.delete_many([_version_key(user_id) for user_id in user_ids])
+    for user_id in user_ids:
+        local.pop(user_id)
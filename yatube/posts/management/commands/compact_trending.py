@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит отсчёт оценок популярного на текущий момент '
+        'и удаляет остывшие посты и группы.'
+    )
+
+    def handle(self, *args, **options):
+        dropped = trending.compact()
+        self.stdout.write(self.style.SUCCESS(f'Удалено оценок: {dropped}.'))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «кого почитать» по друзьям друзей '
+        'и совместным подпискам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend', choices=('auto', 'scipy', 'python'), default='auto',
+            help='auto - SciPy, если установлена.',
+        )
+        parser.add_argument(
+            '--count', type=int, default=recommendations.COUNT,
+            help='Сколько рекомендаций хранить на пользователя.',
+        )
+        parser.add_argument(
+            '--neighbours', type=int, default=recommendations.NEIGHBOURS,
+            help='Сколько похожих авторов учитывать у каждого автора.',
+        )
+        parser.add_argument(
+            '--cofollow-weight', type=float,
+            default=recommendations.COFOLLOW_WEIGHT,
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=recommendations.BATCH_SIZE,
+            help='Пользователей в одной порции расчёта и записи.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=recommendations.CHUNK_SIZE,
+            help='Подписок за один запрос к базе.',
+        )
+
+    def handle(self, *args, **options):
+        backends = recommendations.backends()
+        name = options['backend']
+        if name == 'auto':
+            name = 'scipy' if 'scipy' in backends else 'python'
+        if name not in backends:
+            raise CommandError('SciPy не установлена.')
+        started = time.monotonic()
+        users, authors = recommendations.edges(options['chunk_size'])
+        self.stdout.write(
+            f'Подписок: {len(users)} за {time.monotonic() - started:.1f} с'
+        )
+        saved = recommendations.save(backends[name](
+            users, authors,
+            count=options['count'],
+            neighbours=options['neighbours'],
+            weight=options['cofollow_weight'],
+            batch_size=options['batch_size'],
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.0f} с ({name}): '
+            f'{saved} рекомендаций.'
+        ))
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты, комментарии и подписки в NDJSON. '
+        'Файлы картинок не копируются, пишутся только их имена.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл; *.gz сжимается gzip.')
+        parser.add_argument(
+            '--models', nargs='+', choices=list(transfer.EXPORTS),
+            default=list(transfer.EXPORTS),
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Строк за один запрос к базе и между контрольными точками.',
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <output>.checkpoint.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Дописать файл с места, записанного в контрольной точке.',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        checkpoint = options['checkpoint'] or f'{output}.checkpoint'
+        state = {'offset': 0, 'positions': {}}
+        if options['resume']:
+            state = transfer.load_checkpoint(checkpoint, state)
+        writer = transfer.ChunkWriter(
+            output,
+            compress=options['gzip'] or output.endswith('.gz'),
+            offset=state['offset'],
+        )
+        try:
+            for label in options['models']:
+                self.export(label, writer, state, checkpoint, options)
+        finally:
+            writer.close()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {output}'))
+
+    def export(self, label, writer, state, checkpoint, options):
+        after = state['positions'].get(label, 0)
+        lines = []
+        exported = 0
+        for record in transfer.records(label, after, options['chunk_size']):
+            lines.append(transfer.dumps(record) + '\n')
+            after = record['pk']
+            if len(lines) == options['chunk_size']:
+                exported += self.flush(
+                    label, lines, after, writer, state, checkpoint
+                )
+        if lines:
+            exported += self.flush(
+                label, lines, after, writer, state, checkpoint
+            )
+        self.stdout.write(f'{label}: {exported}')
+
+    def flush(self, label, lines, after, writer, state, checkpoint):
+        state['offset'] = writer.write(lines)
+        state['positions'][label] = after
+        transfer.save_checkpoint(checkpoint, state)
+        count = len(lines)
+        lines.clear()
+        return count
@@ -0,0 +1,77 @@
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из NDJSON export_posts '
+        'порциями. Существующие строки пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON, можно сжатый gzip.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <input>.checkpoint.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Пропустить строки, загруженные в прошлый раз.',
+        )
+
+    def handle(self, *args, **options):
+        self.checkpoint = (
+            options['checkpoint'] or f'{options["input"]}.checkpoint'
+        )
+        self.state = {'lines': 0}
+        if options['resume']:
+            self.state = transfer.load_checkpoint(
+                self.checkpoint, self.state
+            )
+        self.importer = transfer.Importer(
+            f'{self.checkpoint}.journal', options['resume']
+        )
+        self.saved = Counter()
+        with transfer.open_lines(options['input']) as lines:
+            self.load(lines, options['batch_size'])
+        self.importer.refresh()
+        for label, count in self.saved.items():
+            self.stdout.write(f'{label}: {count}')
+        if self.importer.skipped:
+            self.stdout.write(
+                f'Пропущено комментариев к отсутствующим постам: '
+                f'{self.importer.skipped}'
+            )
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def load(self, lines, batch_size):
+        for _ in range(self.state['lines']):
+            next(lines, None)
+        label, batch, consumed = None, [], 0
+        for line in lines:
+            consumed += 1
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record['model'] not in transfer.EXPORTS:
+                raise CommandError(f'Неизвестная модель {record["model"]}')
+            if batch and (
+                record['model'] != label or len(batch) == batch_size
+            ):
+                self.flush(label, batch, consumed - 1)
+                consumed = 1
+                batch = []
+            label = record['model']
+            batch.append(record)
+        if batch:
+            self.flush(label, batch, consumed)
+
+    def flush(self, label, batch, consumed):
+        self.saved[label] += self.importer.save(label, batch)
+        self.state['lines'] += consumed
+        transfer.save_checkpoint(self.checkpoint, self.state)
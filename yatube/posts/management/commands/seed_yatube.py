@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу пользователями, группами, постами, подписками '
+        'и комментариями через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument(
+            '--follows-per-user', type=int, default=20,
+            help='Среднее число подписок у пользователя.',
+        )
+        parser.add_argument(
+            '--comments-per-post', type=int, default=2,
+            help='Среднее число комментариев у поста.',
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок создать; 0 - без картинок.',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument('--batch-size', type=int, default=seed.BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def report(self, model, total, elapsed):
+        if total % (self.batch_size * 20):
+            return
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {total} ({rate:.0f} строк/с)'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        created = seed.build(
+            users=options['users'],
+            posts=options['posts'],
+            groups=options['groups'],
+            follows_per_user=options['follows_per_user'],
+            comments_per_post=options['comments_per_post'],
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            report=self.report,
+        )
+        summary = ', '.join(
+            f'{name}: {count}' for name, count in created.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.0f} с - {summary}.'
+        ))
+        if options['images']:
+            self.stdout.write(
+                'Миниатюры картинок строит manage.py warm_thumbnails.'
+            )
@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from core import fragments
+from posts import feeds, thumbnails, timeline
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры всех картинок постов в пуле процессов, '
+        'пропуская актуальные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 - строить в текущем процессе.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько постов читать и раздавать за раз.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            # Не в MEDIA_ROOT: его содержимое раздаётся всем.
+            default=os.path.join(settings.BASE_DIR, 'warm_thumbnails.json'),
+            help='Файл с последним обработанным постом.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с поста после записанного в checkpoint.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет перестроено.',
+        )
+
+    def load_state(self, path):
+        if os.path.exists(path):
+            with open(path) as state:
+                # Старые файлы хранили ещё и хеши всех картинок.
+                return {'last_id': json.load(state)['last_id']}
+        return {'last_id': 0}
+
+    def save_state(self, path, state):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as tmp:
+            json.dump(state, tmp)
+        os.replace(tmp_path, path)
+
+    def chunks(self, start_id, size):
+        posts = Post.objects.exclude(image='').order_by('id').values_list(
+            'id', 'image', 'thumbnails', 'author_id', 'group_id'
+        )
+        while True:
+            chunk = list(posts.filter(id__gt=start_id)[:size])
+            if not chunk:
+                return
+            yield chunk
+            start_id = chunk[-1][0]
+
+    def handle(self, *args, **options):
+        state = self.load_state(options['checkpoint'])
+        start_id = state['last_id'] if options['resume'] else 0
+        total = Post.objects.exclude(image='').filter(id__gt=start_id).count()
+        self.stdout.write(f'Картинок к обработке: {total}')
+        counts = dict.fromkeys(('fresh', 'built', 'would_build', 'failed'), 0)
+        processed = 0
+        started = time.monotonic()
+        workers = options['workers']
+        pool = ProcessPoolExecutor(workers) if workers else nullcontext()
+        with pool:
+            for chunk in self.chunks(start_id, options['chunk_size']):
+                tasks = [
+                    (post_id, image, urls, options['dry_run'])
+                    for post_id, image, urls, _, _ in chunk
+                ]
+                if workers:
+                    # Процессы пула создаются форком: открытое соединение
+                    # с базой не должно достаться им по наследству.
+                    connections.close_all()
+                    results = list(pool.map(thumbnails.warm, tasks))
+                else:
+                    results = list(map(thumbnails.warm, tasks))
+                self.save_results(chunk, results, options['dry_run'])
+                for _, status, _ in results:
+                    counts[status] += 1
+                processed += len(results)
+                state['last_id'] = chunk[-1][0]
+                if not options['dry_run']:
+                    self.save_state(options['checkpoint'], state)
+                self.report(processed, total, counts, started)
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def save_results(self, chunk, results, dry_run):
+        if dry_run:
+            return
+        images = {post_id: image for post_id, image, *_ in chunk}
+        built = set()
+        with transaction.atomic():
+            for post_id, status, urls in results:
+                if status != 'built':
+                    continue
+                Post.objects.filter(pk=post_id, image=images[post_id]).update(
+                    thumbnails=json.dumps(urls)
+                )
+                Post.cached.invalidate(Post(pk=post_id))
+                built.add(post_id)
+        self.refresh_feeds(
+            (author_id, group_id)
+            for post_id, _, _, author_id, group_id in chunk
+            if post_id in built
+        )
+
+    def refresh_feeds(self, posts):
+        """Сбрасывает кеш лент с перестроенными постами, чтобы они
+        показали новый <picture>, включая ленты подписчиков."""
+        authors, groups = set(), set()
+        for author_id, group_id in posts:
+            authors.add(author_id)
+            if group_id is not None:
+                groups.add(group_id)
+        if not authors:
+            return
+        fragments.bump(
+            feeds.INDEX,
+            *(feeds.author(author_id) for author_id in authors),
+            *(feeds.group(group_id) for group_id in groups),
+        )
+        for author_id in authors:
+            timeline.touch(author_id)
+
+    def report(self, processed, total, counts, started):
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        summary = ', '.join(f'{key}: {value}' for key, value in counts.items())
+        self.stdout.write(
+            f'{processed}/{total} ({rate:.1f} картинок/с) - {summary}'
+        )
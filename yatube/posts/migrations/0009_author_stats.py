@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_auto_20261017_0433'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunSQL(
+            '''
+            UPDATE posts_post SET comment_count = (
+                SELECT COUNT(*) FROM posts_comment
+                WHERE posts_comment.post_id = posts_post.id
+            )
+            ''',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            '''
+            INSERT INTO posts_authorstats
+                (user_id, posts_count, followers_count, following_count)
+            SELECT
+                u.id,
+                (SELECT COUNT(*) FROM posts_post p WHERE p.author_id = u.id),
+                (SELECT COUNT(*) FROM posts_follow f WHERE f.author_id = u.id),
+                (SELECT COUNT(*) FROM posts_follow f WHERE f.user_id = u.id)
+            FROM auth_user u
+            ''',
+            migrations.RunSQL.noop,
+        ),
+    ]
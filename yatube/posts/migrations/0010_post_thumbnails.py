@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_author_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, editable=False, help_text='Адреса готовых миниатюр в JSON', verbose_name='Миниатюры'),
+        ),
+    ]
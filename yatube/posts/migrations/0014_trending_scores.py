@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupScore',
+            fields=[
+                ('score', models.FloatField(default=0, verbose_name='Оценка')),
+                ('epoch', models.FloatField(verbose_name='Отсчёт оценки')),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Group')),
+            ],
+            options={
+                'verbose_name': 'Популярность группы',
+                'verbose_name_plural': 'Популярность групп',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('score', models.FloatField(default=0, verbose_name='Оценка')),
+                ('epoch', models.FloatField(verbose_name='Отсчёт оценки')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Post')),
+            ],
+            options={
+                'verbose_name': 'Популярность поста',
+                'verbose_name_plural': 'Популярность постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postscore',
+            index=models.Index(fields=['-score', '-post'], name='postscore_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupscore',
+            index=models.Index(fields=['-score'], name='groupscore_score_idx'),
+        ),
+    ]
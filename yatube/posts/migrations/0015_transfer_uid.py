@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:34
+
+from django.db import migrations, models
+import uuid
+
+
+def fill_uids(apps, schema_editor):
+    # Каждой существующей строке свой ключ: default в AddField
+    # вычисляется один раз на всю таблицу.
+    for name in ('Post', 'Comment'):
+        model = apps.get_model('posts', name)
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:1000])
+            if not batch:
+                break
+            model.objects.bulk_update(
+                [model(pk=pk, uid=uuid.uuid4()) for pk in batch], ['uid']
+            )
+            last_id = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_trending_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='uid',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Ключ переноса'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='uid',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Ключ переноса'),
+        ),
+        migrations.RunPython(fill_uids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='comment',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Сохраняется при переносе между инсталляциями', unique=True, verbose_name='Ключ переноса'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Сохраняется при переносе между инсталляциями', unique=True, verbose_name='Ключ переноса'),
+        ),
+    ]
@@ -1,10 +1,15 @@
+import json
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.managers import CachedManager
 from core.models import CreatedModel
 
 
 User = get_user_model()
+cached_users = CachedManager.for_model(User, lookups=('username',))
 
 
 class Group(models.Model):
@@ -12,6 +17,9 @@ class Group(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField()
 
+    objects = models.Manager()
+    cached = CachedManager(lookups=('slug',))
+
     class Meta:
         verbose_name = 'Группа'
         verbose_name_plural = 'Группы'
@@ -20,6 +28,27 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые нужны карточке поста в ленте.
+    FEED_FIELDS = (
+        'id',
+        'text',
+        'created',
+        'image',
+        'thumbnails',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__slug',
+    )
+
+    def for_feed(self):
+        """Посты ленты с автором и группой в одном запросе."""
+        return self.select_related('author', 'group').only(
+            'author', 'group', *self.FEED_FIELDS
+        )
+
+
 class Post(CreatedModel):
     text = models.TextField('Текст поста')
     group = models.ForeignKey(
@@ -40,15 +69,56 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        editable=False,
+        help_text='Адреса готовых миниатюр в JSON',
+    )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+    uid = models.UUIDField(
+        'Ключ переноса',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text='Сохраняется при переносе между инсталляциями',
+    )
+
+    objects = PostQuerySet.as_manager()
+    cached = CachedManager()
 
     class Meta:
         ordering = ['-created']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты листаются курсором по (-created, -id).
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='post_created_idx',
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created_idx',
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def thumbnail_urls(self):
+        """Адреса готовых миниатюр по именам из THUMBNAIL_SIZES."""
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -66,11 +136,24 @@ class Comment(CreatedModel):
         'Текст комментария',
         help_text='Введите текст комментария'
     )
+    uid = models.UUIDField(
+        'Ключ переноса',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text='Сохраняется при переносе между инсталляциями',
+    )
 
     class Meta:
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -94,3 +177,147 @@ class Follow(models.Model):
                 name='unique_follow',
             )
         ]
+        # Подписчики автора: раздача ленты и счётчики.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые иначе пришлось бы считать COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        ordering = ['-created', '-post']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+
+class Recommendation(models.Model):
+    """Автор, которого стоит предложить пользователю.
+
+    Таблицу целиком пересчитывает manage.py compute_recommendations.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField('Оценка')
+    rank = models.PositiveSmallIntegerField('Место')
+
+    class Meta:
+        ordering = ['user', 'rank']
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        # Индекс ограничения отдаёт рекомендации пользователя по порядку.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'rank'],
+                name='unique_recommendation_rank',
+            )
+        ]
+
+
+class TrendingScore(models.Model):
+    """Затухающая во времени популярность; см. posts.trending.
+
+    score отсчитан от момента epoch (секунды Unix), строки без
+    заметной активности удаляет compact_trending.
+    """
+    score = models.FloatField('Оценка', default=0)
+    epoch = models.FloatField('Отсчёт оценки')
+
+    class Meta:
+        abstract = True
+
+
+class PostScore(TrendingScore):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+    )
+
+    class Meta:
+        verbose_name = 'Популярность поста'
+        verbose_name_plural = 'Популярность постов'
+        indexes = [
+            models.Index(
+                fields=['-score', '-post'],
+                name='postscore_score_idx',
+            ),
+        ]
+
+
+class GroupScore(TrendingScore):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+    )
+
+    class Meta:
+        verbose_name = 'Популярность группы'
+        verbose_name_plural = 'Популярность групп'
+        indexes = [
+            models.Index(fields=['-score'], name='groupscore_score_idx'),
+        ]
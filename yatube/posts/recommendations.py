@@ -0,0 +1,277 @@
+"""Рекомендации «кого почитать».
+
+Оценка автора c для пользователя u складывается по матрице подписок A
+(A[u, f] = 1, если u подписан на f) из двух частей:
+
+- друзья друзей, (A·A)[u, c]: сколько авторов из подписок u сами
+  подписаны на c;
+- совместные подписки, (A·S)[u, c]: насколько c похож на авторов
+  из подписок u. S[f, c] - косинусная близость f и c по общим
+  подписчикам, где подписчик с n подписками весит 1 / log2(n + 2),
+  а у каждого автора остаются NEIGHBOURS самых близких.
+
+Матрицы считаются в SciPy, если она установлена, иначе - словарями
+в чистом Python с тем же результатом с точностью до округления;
+второе годится только для небольших баз.
+"""
+import math
+from array import array
+from collections import Counter, defaultdict
+from heapq import nsmallest
+
+from django.conf import settings
+from django.db import transaction
+
+from core import bulk
+
+from . import graph
+from .models import Follow, Recommendation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+COUNT = 10
+NEIGHBOURS = 20
+COFOLLOW_WEIGHT = 0.5
+# Читатели, подписанные на всех подряд, о близости авторов
+# почти ничего не говорят, а считать их дороже всего.
+MAX_FOLLOWING = 1000
+BATCH_SIZE = 10000
+CHUNK_SIZE = 100000
+# Сколько произведений допускается в одном блоке A^T·A.
+BLOCK_BUDGET = 2 * 10 ** 7
+PRECISION = 6
+
+
+def edges(chunk_size=CHUNK_SIZE):
+    """Все подписки двумя массивами: user_id и author_id.
+
+    Таблица читается порциями по pk, и в памяти не бывает
+    больше chunk_size строк из базы.
+    """
+    users, authors = array('I'), array('I')
+    rows = Follow.objects.order_by('pk').values_list(
+        'pk', 'user_id', 'author_id'
+    )
+    last = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last)[:chunk_size])
+        if not chunk:
+            return users, authors
+        users.extend(row[1] for row in chunk)
+        authors.extend(row[2] for row in chunk)
+        last = chunk[-1][0]
+
+
+def _best(scores, count):
+    """count лучших (id, оценка); при равенстве - меньший id."""
+    return nsmallest(
+        count,
+        ((key, value) for key, value in scores.items() if value > 0),
+        key=lambda item: (-item[1], item[0]),
+    )
+
+
+def _batch_rows(ranked):
+    return [
+        (user_id, author_id, score, rank)
+        for user_id, best in ranked
+        for rank, (author_id, score) in enumerate(best, 1)
+    ]
+
+
+def _python_neighbours(following, followers, neighbours):
+    """S словарём: автор -> [(похожий автор, близость), ...]."""
+    weights = {
+        user_id: 1 / math.log2(len(followees) + 2)
+        for user_id, followees in following.items()
+        if len(followees) <= MAX_FOLLOWING
+    }
+    norm = {
+        author_id: 1 / math.sqrt(len(fans))
+        for author_id, fans in followers.items()
+    }
+    similar = {}
+    for author_id, fans in followers.items():
+        sums = Counter()
+        for user_id in fans:
+            if user_id in weights:
+                for other in following[user_id]:
+                    sums[other] += weights[user_id]
+        sums.pop(author_id, None)
+        similar[author_id] = _best({
+            other: round(value * norm[author_id] * norm[other], PRECISION)
+            for other, value in sums.items()
+        }, neighbours)
+    return similar
+
+
+def _python_user_scores(user_id, following, similar, weight):
+    scores = Counter()
+    for followee in following.get(user_id, ()):
+        for other in following.get(followee, ()):
+            scores[other] += 1
+        for other, value in similar.get(followee, ()):
+            scores[other] += weight * value
+    for followee in [user_id, *following.get(user_id, ())]:
+        scores.pop(followee, None)
+    return {
+        other: round(value, PRECISION) for other, value in scores.items()
+    }
+
+
+def python_scores(users, authors, count=COUNT, neighbours=NEIGHBOURS,
+                  weight=COFOLLOW_WEIGHT, batch_size=BATCH_SIZE):
+    """Порции (lo, hi, строки) рекомендаций для user_id из [lo, hi)."""
+    following, followers = defaultdict(list), defaultdict(list)
+    for user_id, author_id in zip(users, authors):
+        following[user_id].append(author_id)
+        followers[author_id].append(user_id)
+    similar = _python_neighbours(following, followers, neighbours)
+    size = max(max(users, default=-1), max(authors, default=-1)) + 1
+    for lo in range(0, size, batch_size):
+        ranked = []
+        for user_id in range(lo, min(lo + batch_size, size)):
+            scores = _python_user_scores(user_id, following, similar, weight)
+            if scores:
+                ranked.append((user_id, _best(scores, count)))
+        yield lo, lo + batch_size, _batch_rows(ranked)
+
+
+def _top_k(matrix, count):
+    """Строки, столбцы и значения count лучших в каждой строке CSR
+    и их места с единицы; при равенстве - меньший столбец."""
+    matrix.data = np.round(matrix.data, PRECISION)
+    matrix.data[matrix.data < 0] = 0
+    matrix.eliminate_zeros()
+    lengths = np.diff(matrix.indptr)
+    rows = np.repeat(np.arange(matrix.shape[0]), lengths)
+    order = np.lexsort((matrix.indices, -matrix.data, rows))
+    rank = np.arange(len(order)) - np.repeat(matrix.indptr[:-1], lengths)
+    keep = rank < count
+    order = order[keep]
+    return (
+        rows[order], matrix.indices[order], matrix.data[order],
+        rank[keep] + 1,
+    )
+
+
+def _without(matrix, mask):
+    """Обнуляет в matrix позиции ненулевых элементов mask."""
+    return (matrix - matrix.multiply(mask.astype(bool))).tocsr()
+
+
+def _blocks(costs, budget):
+    """Границы блоков строк, где сумма costs не больше budget;
+    строка дороже budget идёт отдельным блоком."""
+    bounds = [0]
+    total = np.cumsum(costs)
+    while bounds[-1] < len(costs):
+        start = bounds[-1]
+        base = total[start - 1] if start else 0
+        end = int(np.searchsorted(total, base + budget, side='right'))
+        bounds.append(max(end, start + 1))
+    return zip(bounds, bounds[1:])
+
+
+def neighbours_matrix(follows, neighbours=NEIGHBOURS, budget=BLOCK_BUDGET):
+    """S с NEIGHBOURS самыми близкими авторами в каждой строке."""
+    size = follows.shape[0]
+    outdegree = np.diff(follows.indptr)
+    indegree = np.bincount(follows.indices, minlength=size)
+    weights = np.where(
+        outdegree <= MAX_FOLLOWING, 1 / np.log2(outdegree + 2), 0
+    )
+    weighted = (sparse.diags(weights) @ follows).tocsr()
+    fans = follows.T.tocsr()
+    norm = np.zeros(size)
+    norm[indegree > 0] = 1 / np.sqrt(indegree[indegree > 0])
+    # Размер блока A^T·W·A растёт с подписками подписчиков автора,
+    # а у популярных авторов их миллионы: режем по оценке работы.
+    costs = fans @ np.where(weights > 0, outdegree, 0)
+    parts = []
+    for lo, hi in _blocks(costs, budget):
+        block = sparse.diags(norm[lo:hi]) @ (fans[lo:hi] @ weighted)
+        block = _without(
+            block @ sparse.diags(norm), sparse.eye(hi - lo, size, k=lo)
+        )
+        rows, columns, values, _ = _top_k(block, neighbours)
+        parts.append((rows + lo, columns, values))
+    if not parts:
+        return sparse.csr_matrix((size, size))
+    rows, columns, values = (np.concatenate(part) for part in zip(*parts))
+    return sparse.csr_matrix((values, (rows, columns)), shape=(size, size))
+
+
+def scipy_scores(users, authors, count=COUNT, neighbours=NEIGHBOURS,
+                 weight=COFOLLOW_WEIGHT, batch_size=BATCH_SIZE):
+    """То же, что python_scores, на разреженных матрицах."""
+    users = np.frombuffer(users, dtype=np.uintc)
+    authors = np.frombuffer(authors, dtype=np.uintc)
+    size = int(max(users.max(initial=0), authors.max(initial=0))) + 1
+    if not len(users):
+        size = 0
+    follows = sparse.csr_matrix(
+        (np.ones(len(users)), (users, authors)), shape=(size, size)
+    )
+    similar = neighbours_matrix(follows, neighbours)
+    for lo in range(0, size, batch_size):
+        hi = min(lo + batch_size, size)
+        own = follows[lo:hi]
+        scores = own @ follows + weight * (own @ similar)
+        scores = _without(
+            _without(scores, own), sparse.eye(hi - lo, size, k=lo)
+        )
+        rows, columns, values, ranks = _top_k(scores, count)
+        yield lo, lo + batch_size, list(zip(
+            (rows + lo).tolist(), columns.tolist(),
+            values.tolist(), ranks.tolist(),
+        ))
+
+
+def backends():
+    """Доступные реализации расчёта по именам."""
+    found = {'python': python_scores}
+    if sparse is not None:
+        found['scipy'] = scipy_scores
+    return found
+
+
+def save(batches):
+    """Заменяет рекомендации порциями пользователей; возвращает
+    число записанных строк."""
+    total = 0
+    hi = 0
+    for lo, hi, rows in batches:
+        with transaction.atomic():
+            Recommendation.objects.filter(
+                user_id__gte=lo, user_id__lt=hi
+            ).delete()
+            total += bulk.insert_rows(
+                Recommendation, ('user', 'author', 'score', 'rank'), rows
+            )
+    Recommendation.objects.filter(user_id__gte=hi).delete()
+    return total
+
+
+def for_user(user_id, limit=None):
+    """Рекомендованные авторы одним чтением по индексу (user, rank).
+
+    Тех, на кого пользователь подписался после расчёта, отсеивает
+    граф подписок.
+    """
+    followed = graph.following(user_id)
+    found = Recommendation.objects.filter(user_id=user_id).select_related(
+        'author'
+    ).only(
+        'author', 'author__username',
+        'author__first_name', 'author__last_name',
+    )[:COUNT]
+    authors = [
+        item.author for item in found
+        if not graph.contains(followed, item.author_id)
+    ]
+    return authors[:limit or settings.RECOMMENDATIONS_SHOWN]
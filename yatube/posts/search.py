@@ -0,0 +1,207 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from core import bulk
+from core.paginator import CursorPaginator, pack_cursor, unpack_cursor
+
+from .models import Post
+
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 10
+# Сколько постов index_many индексирует одним запросом.
+INDEX_BATCH_SIZE = 500
+
+BACKENDS = {
+    'sqlite': 'posts.search.SQLiteFTS5Backend',
+}
+DEFAULT_BACKEND = 'posts.search.DatabaseBackend'
+
+
+def terms(query):
+    """Слова запроса в нижнем регистре, без операторов и кавычек."""
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def get_backend():
+    """Бэкенд из SEARCH_BACKEND или подходящий для текущей базы."""
+    path = settings.SEARCH_BACKEND or BACKENDS.get(
+        connection.vendor, DEFAULT_BACKEND
+    )
+    return import_string(path)()
+
+
+class SearchBackend:
+    """Интерфейс поискового индекса постов.
+
+    search() возвращает пары (id поста, ранг) по возрастанию ранга:
+    чем меньше ранг, тем выше пост в выдаче. after - пара (ранг, id),
+    за которой продолжается выдача.
+    """
+
+    def index(self, post):
+        """Добавляет или обновляет пост в индексе."""
+
+    def index_many(self, post_ids):
+        """Добавляет в индекс посты с этими id."""
+        for post in Post.objects.filter(pk__in=post_ids).iterator():
+            self.index(post)
+
+    def remove(self, post_id):
+        """Убирает пост из индекса."""
+
+    def rebuild(self):
+        """Строит индекс заново по всем постам."""
+
+    def search(self, query, limit, after=None, forward=True):
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Оставляет в queryset посты, подходящие под запрос."""
+        raise NotImplementedError
+
+
+class DatabaseBackend(SearchBackend):
+    """Запасной бэкенд без индекса: LIKE по каждому слову,
+    выдача от новых постов к старым."""
+
+    def filter(self, queryset, query):
+        words = terms(query)
+        if not words:
+            return queryset.none()
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+
+    def search(self, query, limit, after=None, forward=True):
+        posts = self.filter(Post.objects.all(), query)
+        if after is not None:
+            lookup = 'lt' if forward else 'gt'
+            posts = posts.filter(**{f'pk__{lookup}': after[1]})
+        posts = posts.order_by('-pk' if forward else 'pk')
+        return [(pk, -pk) for pk in posts.values_list('pk', flat=True)[:limit]]
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Индекс в виртуальной таблице FTS5, ранжирование по bm25.
+
+    Таблица создаётся миграцией, rowid строки совпадает с id поста.
+    Каждое слово запроса ищется как префикс: это заменяет стемминг
+    для окончаний русских слов.
+    """
+    table = 'posts_post_fts'
+
+    def match(self, query):
+        return ' '.join(f'"{word}"*' for word in terms(query))
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text],
+            )
+
+    def index_many(self, post_ids):
+        for batch in bulk.batches(post_ids, INDEX_BATCH_SIZE):
+            params = ', '.join(['%s'] * len(batch))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.table} WHERE rowid IN ({params})',
+                    batch,
+                )
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, text) '
+                    f'SELECT id, text FROM {Post._meta.db_table} '
+                    f'WHERE id IN ({params})',
+                    batch,
+                )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    def search(self, query, limit, after=None, forward=True):
+        expression = self.match(query)
+        if not expression:
+            return []
+        sql = (
+            f'SELECT rowid, bm25({self.table}) AS score FROM {self.table} '
+            f'WHERE {self.table} MATCH %s'
+        )
+        params = [expression]
+        if after is not None:
+            sign = '>' if forward else '<'
+            score, pk = after
+            sql = (
+                f'SELECT * FROM ({sql}) '
+                f'WHERE score {sign} %s OR (score = %s AND rowid {sign} %s)'
+            )
+            params += [score, score, pk]
+        order = '' if forward else ' DESC'
+        sql += f' ORDER BY score{order}, rowid{order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def filter(self, queryset, query):
+        expression = self.match(query)
+        if not expression:
+            return queryset.none()
+        # pk__in=RawSQL(...) даёт IN ((SELECT ...)), и SQLite
+        # считает такой подзапрос скалярным.
+        return queryset.extra(
+            where=[
+                f'{Post._meta.db_table}.id IN (SELECT rowid FROM '
+                f'{self.table} WHERE {self.table} MATCH %s)'
+            ],
+            params=[expression],
+        )
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по ключу (ранг, id)."""
+
+    def __init__(self, object_list, per_page, query, backend=None):
+        super().__init__(object_list, per_page)
+        self.query = query
+        self.backend = backend or get_backend()
+
+    def encode(self, post):
+        return pack_cursor(repr(post.search_rank), post.pk)
+
+    def decode(self, token):
+        try:
+            rank, pk = unpack_cursor(token)
+            return float(rank), int(pk)
+        except (TypeError, ValueError):
+            return None
+
+    def fetch(self, rank, pk, forward=True):
+        after = None if rank is None else (rank, pk)
+        hits = self.backend.search(
+            self.query, self.per_page + 1, after, forward
+        )
+        posts = self.object_list.in_bulk([post_id for post_id, _ in hits])
+        items = []
+        # Индекс мог отстать от таблицы: удалённые посты пропускаются.
+        for post_id, rank in hits:
+            if post_id in posts:
+                posts[post_id].search_rank = rank
+                items.append(posts[post_id])
+        return items
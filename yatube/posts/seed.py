@@ -0,0 +1,263 @@
+"""Генерация больших наборов данных: seed_yatube и бенчмарки."""
+import io
+import itertools
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from core import fragments
+from core.bulk import (
+    BATCH_SIZE, analyze, batches, db_datetime, db_uuid, insert, insert_rows
+)
+
+from . import counters, feeds, graph, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+TEXTS = 1000
+IMAGE_SIZE = (960, 540)
+
+
+class Zipf:
+    """Выбор из range(n) с вероятностью ~ 1 / (i + 1) ** s."""
+
+    def __init__(self, n, s, rng):
+        self.population = range(n)
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank ** s for rank in range(1, n + 1)
+        ))
+        self.rng = rng
+
+    def sample(self, k=1):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        )
+
+
+def heavy_tailed(mean, rng, cap=None, alpha=2.0):
+    """Целое со средним mean и степенным хвостом, как у закона Ципфа:
+    у большинства мало, у единиц на порядки больше."""
+    value = mean * (alpha - 1) / alpha * rng.paretovariate(alpha)
+    value = int(value + rng.random())
+    return value if cap is None else min(value, cap)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """Снимает индексы из Meta.indexes на время загрузки.
+
+    Построить индекс по готовой таблице в разы быстрее, чем
+    обновлять его на каждой вставленной строке.
+    """
+    with connection.schema_editor() as editor:
+        for model in models:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+
+
+def make_images(count, rng):
+    """Сохраняет count разных картинок и возвращает их имена."""
+    names = []
+    for i in range(count):
+        image = Image.new('RGB', IMAGE_SIZE, tuple(
+            rng.randrange(256) for _ in range(3)
+        ))
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x, y = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+            draw.ellipse(
+                (x, y, x + rng.randrange(40, 400), y + rng.randrange(40, 400)),
+                fill=tuple(rng.randrange(256) for _ in range(3)),
+            )
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=80)
+        names.append(default_storage.save(
+            f'posts/seed/{i}.jpg', ContentFile(buffer.getvalue())
+        ))
+    return names
+
+
+class Seeder:
+    """Генератор строк для всех моделей одного набора данных.
+
+    Популярность авторов распределена по Ципфу; число подписок
+    у читателя и комментариев у поста - со степенным хвостом.
+    Самые читаемые и самые пишущие авторы - разные люди, иначе ленты
+    подписок разрастаются до (подписчики x все посты).
+    """
+
+    def __init__(self, users, posts, groups=20, follows_per_user=20,
+                 comments_per_post=2, images=0, image_ratio=0.2, days=365,
+                 seed=0, batch_size=BATCH_SIZE):
+        self.users = users
+        self.posts = posts
+        self.follows_per_user = follows_per_user
+        self.comments_per_post = comments_per_post
+        self.image_ratio = image_ratio
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.texts = [
+            self.fake.paragraph(nb_sentences=3) for _ in range(TEXTS)
+        ]
+        self.names = [
+            (self.fake.first_name(), self.fake.last_name())
+            for _ in range(TEXTS)
+        ]
+        self.pictures = make_images(images, self.rng) if images else []
+        self.now = timezone.now()
+        self.span = timedelta(days=days).total_seconds()
+        first_group = next_id(Group)
+        first_user = next_id(User)
+        self.first_post = next_id(Post)
+        # Ключи переноса из отдельного генератора, чтобы не сдвигать
+        # остальные данные, и свои для каждой дозагрузки в ту же базу.
+        self.keys = random.Random(f'{seed}:{self.first_post}')
+        self.group_ids = [*range(first_group, first_group + groups), None]
+        self.user_ids = range(first_user, first_user + users)
+        self.writers = list(self.user_ids)
+        self.rng.shuffle(self.writers)
+        self.popular = Zipf(users, 1.1, self.rng)
+        self.prolific = Zipf(users, 0.8, self.rng)
+
+    def group_rows(self):
+        for group_id in self.group_ids[:-1]:
+            yield Group(
+                id=group_id,
+                title=self.fake.sentence(nb_words=3)[:200],
+                slug=f'group-{group_id}',
+                description=self.rng.choice(self.texts),
+            )
+
+    def user_rows(self):
+        password = make_password(None)
+        for user_id in self.user_ids:
+            first_name, last_name = self.rng.choice(self.names)
+            yield User(
+                id=user_id,
+                username=f'user{user_id}',
+                first_name=first_name,
+                last_name=last_name,
+                password=password,
+                date_joined=self.now,
+            )
+
+    def follow_rows(self):
+        for user_id in self.user_ids:
+            count = heavy_tailed(
+                self.follows_per_user, self.rng, cap=self.users - 1
+            )
+            authors = {
+                self.user_ids[rank] for rank in self.popular.sample(count)
+            }
+            for author_id in authors - {user_id}:
+                yield user_id, author_id
+
+    def post_date(self, i):
+        # Посты идут по возрастанию даты, как и в жизни.
+        return db_datetime(
+            self.now - timedelta(seconds=self.span * (1 - i / self.posts))
+        )
+
+    def image(self):
+        if self.pictures and self.rng.random() < self.image_ratio:
+            return self.rng.choice(self.pictures)
+        return ''
+
+    def uid(self):
+        return db_uuid(uuid.UUID(int=self.keys.getrandbits(128), version=4))
+
+    def post_rows(self):
+        rng = self.rng
+        for start in range(0, self.posts, self.batch_size):
+            size = min(self.batch_size, self.posts - start)
+            authors = self.prolific.sample(size)
+            for i, rank in enumerate(authors, start):
+                yield (
+                    self.first_post + i, self.post_date(i),
+                    rng.choice(self.texts), rng.choice(self.group_ids),
+                    self.writers[rank], self.image(), '', 0, self.uid(),
+                )
+
+    def comment_rows(self):
+        rng = self.rng
+        for i in range(self.posts):
+            created = self.post_date(i)
+            for _ in range(heavy_tailed(self.comments_per_post, rng)):
+                yield (
+                    self.first_post + i, rng.choice(self.user_ids),
+                    rng.choice(self.texts), created, self.uid(),
+                )
+
+    def run(self, report=None):
+        """Заполняет базу и возвращает число строк по моделям.
+
+        Вставка идёт мимо сигналов, поэтому счётчики, ленты
+        и поисковый индекс в конце пересчитываются целиком, а кеш лент
+        и графа подписок сбрасывается.
+        """
+        size = self.batch_size
+        created = {
+            'group': insert(Group, self.group_rows(), size, report),
+            'user': insert(User, self.user_rows(), size, report),
+        }
+        with deferred_indexes(Follow, Post, Comment):
+            created['follow'] = insert_rows(
+                Follow, ('user', 'author'), self.follow_rows(), size, report
+            )
+            created['post'] = insert_rows(
+                Post,
+                ('id', 'created', 'text', 'group', 'author', 'image',
+                 'thumbnails', 'comment_count', 'uid'),
+                self.post_rows(), size, report,
+            )
+            created['comment'] = insert_rows(
+                Comment, ('post', 'author', 'text', 'created', 'uid'),
+                self.comment_rows(), size, report,
+            )
+        with transaction.atomic():
+            counters.recount()
+            timeline.rebuild()
+            search.get_backend().rebuild()
+        analyze()
+        self.refresh_caches()
+        return created
+
+    def refresh_caches(self):
+        fragments.bump(
+            feeds.INDEX, feeds.CELEBRITIES,
+            *(feeds.group(group_id) for group_id in self.group_ids),
+        )
+        for batch in batches(self.user_ids, self.batch_size):
+            fragments.bump(
+                *(feeds.author(user_id) for user_id in batch),
+                *(feeds.follow(user_id) for user_id in batch),
+            )
+            graph.forget(*batch)
+
+
+def build(users, posts, report=None, **options):
+    """Набор данных из users пользователей и posts постов;
+    остальные параметры - как у Seeder."""
+    return Seeder(users, posts, **options).run(report)
@@ -0,0 +1,199 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import counters, feeds, graph, search, tasks, thumbnails, timeline
+from .models import (
+    AuthorStats, Comment, Follow, Group, Post, User, cached_users
+)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Группа до правки: из её ленты пост тоже должен пропасть.
+    instance._initial_group_id = instance.__dict__.get('group_id')
+    instance._initial_image = instance.__dict__.get('image')
+
+
+# Поля, которые карточки постов показывают из автора и группы.
+CARD_FIELDS = {
+    User: ('username', 'first_name', 'last_name'),
+    Group: ('slug', 'title'),
+}
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Group)
+def remember_card_fields(sender, instance, **kwargs):
+    instance._initial_card = [
+        instance.__dict__.get(field) for field in CARD_FIELDS[sender]
+    ]
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def refresh_cards(sender, instance, created, raw=False, **kwargs):
+    card = [getattr(instance, field) for field in CARD_FIELDS[sender]]
+    changed = card != instance._initial_card
+    instance._initial_card = card
+    if created or raw or not changed:
+        return
+    if sender is User:
+        tasks.refresh_author_feeds.delay(
+            instance.pk, key=f'refresh_author_feeds:{instance.pk}'
+        )
+    else:
+        tasks.refresh_group_feeds.delay(
+            instance.pk, key=f'refresh_group_feeds:{instance.pk}'
+        )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    feeds.bump_post(instance, instance._initial_group_id)
+    instance._initial_group_id = instance.group_id
+    if created:
+        tasks.fan_out.delay(instance.pk, key=f'fan_out:{instance.pk}')
+    else:
+        touch_timelines(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_feeds(sender, instance, **kwargs):
+    feeds.bump_post(instance, instance._initial_group_id)
+    touch_timelines(instance.author_id)
+
+
+def touch_timelines(author_id):
+    tasks.touch_timelines.delay(author_id, key=f'touch:{author_id}')
+
+
+@receiver(post_save, sender=Comment)
+def bump_commented_post(sender, instance, created, **kwargs):
+    if created:
+        feeds.bump_post(instance.post)
+        tasks.record_comment.delay(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        # Посты автора могут исчисляться тысячами.
+        tasks.backfill_timeline.delay(instance.user_id, [instance.author_id])
+        tasks.record_follow.delay(
+            instance.author_id, key=f'trending:follow:{instance.author_id}'
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.trim(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def add_to_graph(sender, instance, created, **kwargs):
+    if created:
+        graph.update(instance.user_id, added=[instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_graph(sender, instance, **kwargs):
+    graph.update(instance.user_id, removed=[instance.author_id])
+
+
+@receiver(post_save, sender=User)
+def reset_graph(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        graph.reset(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def forget_graph(sender, instance, **kwargs):
+    graph.forget(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_object(sender, instance, **kwargs):
+    manager = cached_users if sender is User else sender.cached
+    manager.invalidate(instance)
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.update_author(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.update_author(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.update_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.update_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.update_author(instance.author_id, followers_count=1)
+        counters.update_author(instance.user_id, following_count=1)
+        if timeline.new_celebrities([instance.author_id]):
+            timeline.forget_celebrities()
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.update_author(instance.author_id, followers_count=-1)
+    counters.update_author(instance.user_id, following_count=-1)
+    fan_out_former_celebrities([instance.author_id])
+
+
+def fan_out_former_celebrities(author_ids):
+    """Раздаёт посты авторов, которые после отписки перестали быть
+    популярными; проверяется уже уменьшенный счётчик."""
+    former = timeline.former_celebrities(author_ids)
+    if former:
+        timeline.forget_celebrities()
+    for author_id in former:
+        tasks.fan_out_author.delay(
+            author_id, key=f'fan_out_author:{author_id}'
+        )
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, created, **kwargs):
+    changed = instance.image != getattr(instance, '_initial_image', None)
+    instance._initial_image = instance.image.name
+    if changed and instance.thumbnails:
+        instance.thumbnails = ''
+        Post.objects.filter(pk=instance.pk).update(thumbnails='')
+    if instance.image and (changed or not instance.thumbnails):
+        thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    tasks.index_post.delay(instance.pk, key=f'index:{instance.pk}')
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
@@ -0,0 +1,80 @@
+"""Побочные эффекты записи постов, которые выполняются в фоне."""
+from django.conf import settings
+
+from core import fragments
+from core.tasks import task
+
+from . import feeds, search, timeline, trending
+from .models import Post
+
+
+@task
+def fan_out(post_id):
+    post = Post.objects.only('id', 'author', 'created').filter(
+        pk=post_id
+    ).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@task
+def fan_out_author(author_id):
+    timeline.fan_out_author(author_id)
+
+
+@task
+def touch_timelines(author_id):
+    timeline.touch(author_id)
+
+
+@task
+def refresh_author_feeds(author_id):
+    """Карточки постов показывают имя автора: после его смены
+    обновляются все ленты, где они есть."""
+    group_ids = Post.objects.filter(
+        author_id=author_id, group__isnull=False
+    ).values_list('group_id', flat=True).distinct()
+    feeds.bump_author(author_id, group_ids)
+    timeline.touch(author_id)
+
+
+@task
+def refresh_group_feeds(group_id):
+    """То же после смены slug или названия группы."""
+    fragments.bump(feeds.INDEX, feeds.TRENDING, feeds.group(group_id))
+    authors = Post.objects.filter(
+        group_id=group_id
+    ).values_list('author_id', flat=True).distinct()
+    for author_id in authors.iterator():
+        fragments.bump(feeds.author(author_id))
+        timeline.touch(author_id)
+
+
+@task
+def backfill_timeline(user_id, author_ids):
+    timeline.backfill(user_id, *author_ids)
+
+
+@task
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        search.get_backend().remove(post_id)
+    else:
+        search.get_backend().index(post)
+
+
+@task
+def record_comment(post_id):
+    trending.record({post_id: settings.TRENDING_WEIGHTS['comment']})
+
+
+@task
+def record_follow(author_id):
+    trending.record_follow(author_id)
+
+
+@task
+def record_views(views):
+    weight = settings.TRENDING_WEIGHTS['view']
+    trending.record({post_id: count * weight for post_id, count in views})
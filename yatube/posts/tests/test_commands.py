@@ -0,0 +1,437 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from unittest import mock, skipUnless
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import graph, recommendations, thumbnails, transfer
+from ..models import (
+    AuthorStats, Comment, Follow, Group, Post, Recommendation, TimelineEntry
+)
+from ..search import get_backend
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        # Задача миниатюр остаётся в очереди: их ещё никто не строил.
+        with override_settings(TASKS_EAGER=False):
+            self.post = Post.objects.create(
+                text='Пост с картинкой',
+                author=author,
+                image=SimpleUploadedFile('warm.gif', SMALL_GIF, 'image/gif'),
+            )
+        self.checkpoint = os.path.join(
+            tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT), 'state.json'
+        )
+
+    def warm(self, *args):
+        out = StringIO()
+        call_command(
+            'warm_thumbnails', '--workers=0',
+            f'--checkpoint={self.checkpoint}', *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def test_builds_then_skips_fresh_thumbnails(self):
+        """Актуальные миниатюры при повторном прогоне пропускаются."""
+        self.assertIn('built: 1', self.warm())
+        self.post.refresh_from_db()
+        self.assertIn('card', self.post.thumbnail_urls)
+        self.assertIn('fresh: 1', self.warm())
+
+    def test_rebuilt_thumbnails_refresh_feeds(self):
+        """После перестройки кеш лент сбрасывается."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, '<picture>')
+        self.warm()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+
+    def test_touched_source_with_same_hash_is_fresh(self):
+        """Исходник с новым mtime, но прежним содержимым не перестраивается."""
+        self.warm()
+        future = os.path.getmtime(self.post.image.path) + 60
+        os.utime(self.post.image.path, (future, future))
+        self.assertIn('fresh: 1', self.warm())
+
+    def test_hash_kept_next_to_renditions(self):
+        """Хеш исходника лежит рядом с рендициями, checkpoint - только
+        номер последнего поста."""
+        self.warm()
+        self.assertEqual(
+            thumbnails.read_hash(self.post.image.name),
+            thumbnails.file_hash(self.post.image.path),
+        )
+        with open(self.checkpoint) as state:
+            self.assertEqual(json.load(state), {'last_id': self.post.pk})
+
+    def test_changed_source_is_rebuilt(self):
+        """Изменённый исходник перестраивается."""
+        self.warm()
+        with open(self.post.image.path, 'ab') as image:
+            image.write(b'\x00')
+        future = os.path.getmtime(self.post.image.path) + 60
+        os.utime(self.post.image.path, (future, future))
+        self.assertIn('built: 1', self.warm())
+
+    def test_dry_run_changes_nothing(self):
+        """--dry-run не строит миниатюры и не пишет checkpoint."""
+        self.assertIn('would_build: 1', self.warm('--dry-run'))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnails, '')
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_skips_processed_posts(self):
+        """--resume продолжает с поста после checkpoint."""
+        self.warm()
+        self.assertIn('Картинок к обработке: 0', self.warm('--resume'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedYatubeTests(TransactionTestCase):
+    # Индексы снимаются и строятся заново схемой, а на SQLite это
+    # нельзя делать внутри транзакции TestCase.
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        # Очистка таблиц не трогает индекс FTS5: убираем и его.
+        get_backend().rebuild()
+
+    def seed(self, **options):
+        call_command(
+            'seed_yatube', users=30, posts=300, follows_per_user=5,
+            comments_per_post=2, stdout=StringIO(), **options
+        )
+
+    def test_seeded_data_is_consistent(self):
+        """Счётчики, ленты и поиск соответствуют вставленным строкам."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 300)
+        stats = AuthorStats.objects.all()
+        self.assertEqual(sum(row.posts_count for row in stats), 300)
+        self.assertEqual(
+            sum(row.followers_count for row in stats), Follow.objects.count()
+        )
+        self.assertEqual(
+            sum(Post.objects.values_list('comment_count', flat=True)),
+            Comment.objects.count(),
+        )
+        reader = Follow.objects.first().user
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(),
+            Post.objects.filter(author__following__user=reader).count(),
+        )
+        post = Post.objects.first()
+        word = post.text.split()[0]
+        self.assertIn(
+            post, get_backend().filter(Post.objects.all(), word)
+        )
+
+    def test_caches_refreshed(self):
+        """После загрузки кеш ленты и графа подписок не устаревает."""
+        self.client.get(reverse('posts:index'))
+        self.seed()
+        post = Post.objects.first()
+        self.assertContains(self.client.get(reverse('posts:index')), post.text)
+        follow = Follow.objects.first()
+        self.assertTrue(graph.is_following(follow.user_id, follow.author_id))
+
+    def test_posts_dated_in_order_and_indexes_restored(self):
+        """Даты постов растут вместе с id, индексы на месте."""
+        self.seed()
+        ids = list(Post.objects.values_list('id', flat=True))
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table
+            )
+        for index in Post._meta.indexes:
+            self.assertIn(index.name, constraints)
+
+    def test_images_attached(self):
+        """С --images посты получают сгенерированные картинки."""
+        self.seed(images=2, image_ratio=1)
+        self.assertFalse(Post.objects.filter(image='').exists())
+        self.assertEqual(
+            len(set(Post.objects.values_list('image', flat=True))), 2
+        )
+
+
+class RecommendationsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ['reader', 'writer1', 'writer2', 'popular', 'niche', 'fan']
+        cls.users = {
+            name: User.objects.create_user(username=name) for name in names
+        }
+        for user, authors in {
+            'reader': ['writer1', 'writer2'],
+            'writer1': ['popular'],
+            'writer2': ['popular', 'niche'],
+            'fan': ['writer1', 'niche', 'reader'],
+        }.items():
+            for author in authors:
+                Follow.objects.create(
+                    user=cls.users[user], author=cls.users[author]
+                )
+
+    def compute(self, *args):
+        call_command('compute_recommendations', *args, stdout=StringIO())
+
+    def recommended(self, name):
+        return list(Recommendation.objects.filter(
+            user=self.users[name]
+        ).values_list('author__username', flat=True))
+
+    def test_friends_of_friends_first(self):
+        """Выше всех - автор, на которого подписаны обе подписки,
+        сам читатель и его подписки в список не попадают."""
+        self.compute('--backend=python')
+        self.assertEqual(self.recommended('reader'), ['popular', 'niche'])
+        self.assertNotIn('fan', self.recommended('fan'))
+        self.assertEqual(
+            list(Recommendation.objects.filter(
+                user=self.users['reader']
+            ).values_list('rank', flat=True)),
+            [1, 2],
+        )
+
+    def test_stale_rows_replaced(self):
+        """Пересчёт стирает рекомендации, которые больше не выходят."""
+        Recommendation.objects.create(
+            user=self.users['popular'], author=self.users['fan'],
+            score=1, rank=1,
+        )
+        self.compute('--backend=python', '--batch-size=2')
+        self.assertEqual(self.recommended('popular'), [])
+        self.assertTrue(self.recommended('reader'))
+
+    @skipUnless(
+        'scipy' in recommendations.backends(), 'SciPy не установлена'
+    )
+    def test_scipy_matches_python(self):
+        """Матричный расчёт даёт тот же порядок, что и словарный."""
+        users, authors = recommendations.edges(chunk_size=3)
+        by_backend = [
+            [
+                (user, author, rank)
+                for _, _, rows in scores(users, authors, batch_size=3)
+                for user, author, _, rank in rows
+            ]
+            for scores in recommendations.backends().values()
+        ]
+        self.assertEqual(by_backend[0], by_backend[1])
+
+    def shown(self, response):
+        return [
+            author.username for author in response.context['recommendations']
+        ]
+
+    def test_shown_on_profile_and_follow_index(self):
+        """Рекомендации видны читателю, кроме уже подписанных авторов."""
+        self.compute('--backend=python')
+        self.client.force_login(self.users['reader'])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(self.shown(response), ['popular', 'niche'])
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'popular'})
+        )
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'popular'})
+        )
+        self.assertEqual(self.shown(response), ['niche'])
+        self.assertContains(response, 'Кого почитать')
+
+
+class ExportImportTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, group=group
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.path = os.path.join(self.tmp, 'dump.ndjson.gz')
+
+    def export(self, *args):
+        call_command(
+            'export_posts', self.path, '--chunk-size=2', *args,
+            stdout=StringIO(),
+        )
+
+    def import_(self, *args):
+        call_command(
+            'import_posts', self.path, '--batch-size=2', *args,
+            stdout=StringIO(),
+        )
+
+    def read(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as dump:
+            return [json.loads(line) for line in dump]
+
+    def test_round_trip(self):
+        """После выгрузки и загрузки в пустую базу данные те же."""
+        self.export()
+        created = {post.text: post.created for post in self.posts}
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        Group.objects.all().delete()
+        self.import_()
+        self.assertEqual(
+            dict(Post.objects.values_list('text', 'created')), created
+        )
+        self.assertEqual(
+            Post.objects.filter(group__slug='group').count(), 5
+        )
+        self.assertTrue(
+            Comment.objects.filter(post__text='Пост 0').exists()
+        )
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 5
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+
+    def test_import_does_not_reuse_source_pks(self):
+        """Пост с тем же pk в базе назначения не мешает загрузке,
+        а комментарии достаются загруженным постам."""
+        self.export()
+        pks = [post.pk for post in self.posts]
+        created = Comment.objects.get().created
+        Post.objects.all().delete()
+        local = User.objects.create_user(username='local')
+        for pk in pks:
+            Post.objects.create(pk=pk, text='Местный', author=local)
+        self.import_()
+        self.assertEqual(Post.objects.filter(author=local).count(), 5)
+        self.assertEqual(Post.objects.filter(author=self.author).count(), 5)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post.text, 'Пост 0')
+        self.assertEqual(comment.created, created)
+        Post.objects.create(text='После загрузки', author=local)
+
+    def test_rows_with_same_author_and_date_kept(self):
+        """Посты и комментарии с одинаковыми автором и датой, как
+        у seed_yatube, загружаются все: их различает uid."""
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Ещё комментарий'
+        )
+        first = self.posts[0]
+        Post.objects.update(created=first.created)
+        Comment.objects.update(created=first.created)
+        self.export()
+        Post.objects.all().delete()
+        self.import_()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(
+            Comment.objects.filter(author=self.reader).count(), 2
+        )
+
+    def test_import_touches_only_loaded_rows(self):
+        """Счётчики, ленты и индекс обновляются только для загруженного,
+        остальная база не пересчитывается."""
+        self.export()
+        Post.objects.all().delete()
+        local = User.objects.create_user(username='local')
+        other = Post.objects.create(text='Местный', author=local)
+        Post.objects.filter(pk=other.pk).update(comment_count=42)
+        self.import_()
+        self.assertEqual(Post.objects.get(pk=other.pk).comment_count, 42)
+        self.assertEqual(Post.objects.get(text='Пост 0').comment_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+        self.assertEqual(len(get_backend().search('Пост', 10)), 5)
+
+    def test_resume_refreshes_rows_of_failed_run(self):
+        """Загрузка с --resume обновляет и строки, записанные прошлой,
+        упавшей до обновления лент и счётчиков."""
+        self.export()
+        Post.objects.all().delete()
+        with mock.patch.object(
+            transfer.Importer, 'refresh', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.import_()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.import_('--resume')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 5
+        )
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка не дублирует строки."""
+        self.export()
+        self.import_()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_export_resume_appends_new_rows(self):
+        """--resume дописывает только строки после контрольной точки."""
+        self.export('--models', 'posts.post')
+        Post.objects.create(text='Новый', author=self.author)
+        self.export('--models', 'posts.post', '--resume')
+        pks = [record['pk'] for record in self.read()]
+        self.assertEqual(
+            pks, sorted(Post.objects.values_list('pk', flat=True))
+        )
+
+    def test_import_resume_skips_loaded_lines(self):
+        """--resume пропускает строки, загруженные в прошлый раз."""
+        self.export()
+        self.import_()
+        Post.objects.all().delete()
+        self.import_('--resume')
+        self.assertFalse(Post.objects.exists())
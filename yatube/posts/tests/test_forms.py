@@ -3,7 +3,9 @@ import tempfile
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
@@ -118,6 +120,22 @@ class PostFormTests(TestCase):
             ).exists()
         )
 
+    def test_edit_keeps_concurrent_comment_count(self):
+        """Правка поста не затирает комментарии, пришедшие во время неё."""
+        cache.clear()
+        Post.cached.get(pk=self.post.pk)
+        # Комментарий между чтением поста из кеша и сохранением формы.
+        Post.objects.filter(pk=self.post.pk).update(
+            comment_count=F('comment_count') + 1
+        )
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Правка'},
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.comment_count, 1)
+
     def test_non_authorized_client_cannot_create_post(self):
         """Неавторизованный пользователь не может опубликовать пост"""
         posts_count = Post.objects.count()
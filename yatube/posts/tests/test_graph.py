@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import follows, graph
+from ..models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(4)
+        ]
+        for author in cls.authors[2:0:-1]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, *indexes):
+        return [self.authors[i].pk for i in indexes]
+
+    def test_sorted_arrays_from_db(self):
+        """Массив строится одним запросом и отсортирован."""
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(graph.following(self.reader.pk)), self.ids(1, 2)
+            )
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                graph.is_following(self.reader.pk, self.authors[2].pk)
+            )
+            self.assertFalse(
+                graph.is_following(self.reader.pk, self.authors[0].pk)
+            )
+
+    def test_stale_local_copy_is_refreshed(self):
+        """Копия процесса сверяется с версией в общем кеше."""
+        graph.following(self.reader.pk)
+        stale = graph.local.get(self.reader.pk)
+        graph.store(self.reader.pk, stale[1][:1])
+        graph.local.set(self.reader.pk, stale)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(graph.following(self.reader.pk)), self.ids(1)
+            )
+
+    def test_follow_and_unfollow_patch_arrays(self):
+        """Подписка и отписка правят массив без запросов к базе."""
+        graph.following(self.reader.pk)
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        Follow.objects.filter(
+            user=self.reader, author=self.authors[2]
+        ).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(graph.following(self.reader.pk)), self.ids(0, 1)
+            )
+
+    def test_bulk_follow_updates_graph(self):
+        """Пачка подписок без сигналов тоже попадает в граф."""
+        graph.following(self.reader.pk)
+        follows.follow_many(self.reader, ['author3', 'author0'])
+        follows.unfollow_many(self.reader, ['author1'])
+        self.assertEqual(
+            list(graph.following(self.reader.pk)), self.ids(0, 2, 3)
+        )
+
+    def test_new_user_has_empty_graph(self):
+        """У нового пользователя граф пуст без запроса к базе."""
+        user = User.objects.create_user(username='newcomer')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(graph.following(user.pk)), 0)
+
+    def test_profile_reads_graph(self):
+        """Профиль не спрашивает базу о подписке при тёплом графе."""
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile', kwargs={'username': 'author1'})
+        response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        graph.forget(self.reader.pk)
+        response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        with self.assertNumQueries(0):
+            graph.following(self.reader.pk)
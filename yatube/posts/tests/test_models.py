@@ -1,7 +1,22 @@
+from io import StringIO
+import re
+import unittest
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-from ..models import Group, Post
+from core.paginator import CursorPaginator
+
+from .. import counters
+
+from ..models import (
+    AuthorStats, Comment, Follow, Group, Post, TimelineEntry, cached_users
+)
+from ..timeline import TimelinePaginator
 
 
 User = get_user_model()
@@ -45,3 +60,200 @@ class PostModelTests(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).verbose_name, expected_value
                 )
+
+
+class CachedManagerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cached')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='cached-slug',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_get_skips_database(self):
+        """Повторное чтение объекта не обращается к базе."""
+        Post.cached.get(id=self.post.id)
+        Group.cached.get(slug=self.group.slug)
+        cached_users.get(username=self.user.username)
+        with self.assertNumQueries(0):
+            Post.cached.get(id=self.post.id)
+            Group.cached.get(slug=self.group.slug)
+            cached_users.get(username=self.user.username)
+
+    def test_save_invalidates_cached_object(self):
+        """После правки из кеша читается новая версия объекта."""
+        Post.cached.get(id=self.post.id)
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(Post.cached.get(id=self.post.id).text, 'Новый текст')
+
+    def test_changed_slug_is_not_found(self):
+        """Старый slug не находит группу после переименования."""
+        Group.cached.get(slug='cached-slug')
+        group = Group.objects.get(id=self.group.id)
+        group.slug = 'renamed-slug'
+        group.save()
+        with self.assertRaises(Group.DoesNotExist):
+            Group.cached.get(slug='cached-slug')
+
+    def test_delete_invalidates_cached_object(self):
+        """Удалённый объект не читается из кеша."""
+        post = Post.objects.create(author=self.user, text='Удаляемый')
+        Post.cached.get(id=post.id)
+        post_id = post.id
+        post.delete()
+        with self.assertRaises(Post.DoesNotExist):
+            Post.cached.get(id=post_id)
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, **expected):
+        stats = AuthorStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertStats(self.author, posts_count=1, followers_count=1)
+        self.assertStats(self.reader, following_count=1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertStats(self.author, followers_count=0)
+        self.assertStats(self.reader, following_count=0)
+        post.delete()
+        self.assertStats(self.author, posts_count=0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats пересчитывает счётчики с нуля."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.update(comment_count=42)
+        AuthorStats.objects.all().delete()
+        call_command('recount_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertStats(self.author, posts_count=1, followers_count=1)
+        self.assertStats(self.reader, posts_count=0, following_count=1)
+
+    def test_recount_invalidates_cached_posts(self):
+        """recount_stats сбрасывает кеш исправленных постов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Post.objects.update(comment_count=42)
+        Post.cached.invalidate(post)
+        self.assertEqual(Post.cached.get(pk=post.pk).comment_count, 42)
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(Post.cached.get(pk=post.pk).comment_count, 1)
+
+    def test_recount_walks_posts_in_batches(self):
+        """recount правит посты порциями, не теряя ни одной."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(5)
+        ]
+        for post in posts[::2]:
+            Comment.objects.create(post=post, author=self.reader, text='Т')
+        Post.objects.update(comment_count=7)
+        with mock.patch.object(counters, 'BATCH_SIZE', 2):
+            counters.recount()
+        self.assertEqual(
+            [post.comment_count for post in Post.objects.order_by('pk')],
+            [1, 0, 1, 0, 1],
+        )
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class QueryPlanTests(TestCase):
+    FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(5):
+            cls.post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}'
+            )
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def feed_queries(self):
+        """Первые и следующие страницы лент в том виде, в каком их
+        выбирают пагинаторы."""
+        feeds = Post.objects.for_feed()
+        paginator = CursorPaginator(None, 10)
+        key = CursorPaginator.key
+        entry_key = TimelinePaginator.entry_key
+        feeds = {
+            'index': (feeds, key),
+            'group': (feeds.filter(group=self.group), key),
+            'profile': (feeds.filter(author=self.author), key),
+            'comments': (
+                Comment.objects.filter(post=self.post).select_related(
+                    'author'
+                ),
+                key,
+            ),
+            'follow': (
+                TimelineEntry.objects.filter(user=self.reader).select_related(
+                    'post__author', 'post__group'
+                ),
+                entry_key,
+            ),
+        }
+        queries = {}
+        for name, (queryset, key) in feeds.items():
+            cursor = queryset.values_list(*key).first()
+            queries[name] = paginator.seek(queryset, None, None, key=key)
+            queries[f'{name}, next page'] = paginator.seek(
+                queryset, *cursor, key=key
+            )
+        queries['followers'] = Follow.objects.filter(
+            author=self.author
+        ).values_list('user_id', flat=True)
+        return queries
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты читаются по индексу: без полного прохода и сортировки."""
+        for name, queryset in self.feed_queries().items():
+            with self.subTest(feed=name):
+                plan = self.plan(queryset[:11])
+                for line in plan:
+                    self.assertNotRegex(line, self.FULL_SCAN, plan)
+                    self.assertNotIn('TEMP B-TREE', line, plan)
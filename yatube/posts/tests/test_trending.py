@@ -0,0 +1,162 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import trending
+from ..models import Group, GroupScore, Post, PostScore
+
+User = get_user_model()
+
+HOUR = 60 * 60
+NOW = 1_700_000_000.0
+
+
+@override_settings(TRENDING_HALF_LIFE=HOUR)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author,
+                group=cls.group if i == 0 else None,
+            )
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        trending.buffer.reset()
+        PostScore.objects.all().delete()
+        GroupScore.objects.all().delete()
+
+    def ranking(self):
+        return list(PostScore.objects.order_by(
+            '-score', '-post'
+        ).values_list('post', flat=True))
+
+    def test_older_events_decay(self):
+        """Событие часовой давности весит вдвое меньше свежего."""
+        first, second = self.posts[:2]
+        trending.record({first.pk: 4}, now=NOW)
+        trending.record({second.pk: 3}, now=NOW + HOUR)
+        self.assertEqual(self.ranking(), [second.pk, first.pk])
+        trending.record({first.pk: 2}, now=NOW + HOUR)
+        self.assertEqual(self.ranking(), [first.pk, second.pk])
+        self.assertAlmostEqual(
+            GroupScore.objects.get(group=self.group).score, 4 + 2 * 2
+        )
+
+    def test_compact_rebases_and_drops_cold(self):
+        """Сжатие переносит отсчёт на текущий момент и удаляет остывшее."""
+        hot, cold = self.posts[:2]
+        trending.record({hot.pk: 8, cold.pk: 1}, now=NOW)
+        self.assertEqual(trending.compact(now=NOW + 2 * HOUR), 1)
+        score = PostScore.objects.get()
+        self.assertEqual(score.post_id, hot.pk)
+        self.assertAlmostEqual(score.score, 2)
+        self.assertEqual(score.epoch, NOW + 2 * HOUR)
+        trending.record({cold.pk: 1}, now=NOW + 2 * HOUR)
+        self.assertEqual(
+            PostScore.objects.get(post=cold).epoch, NOW + 2 * HOUR
+        )
+
+    def test_comment_and_follow_feed_scores(self):
+        """Комментарий поднимает пост и группу, подписка - последний
+        пост автора."""
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.posts[0].pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertEqual(self.ranking(), [self.posts[0].pk])
+        self.assertTrue(GroupScore.objects.filter(group=self.group).exists())
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.ranking(), [self.posts[-1].pk, self.posts[0].pk])
+
+    @override_settings(TRENDING_VIEW_BATCH=2)
+    def test_views_are_buffered(self):
+        """Просмотры уходят в базу пачкой, удалённые посты пропускаются."""
+        url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.posts[1].pk}
+        )
+        self.client.get(url)
+        self.assertFalse(PostScore.objects.exists())
+        self.client.get(url)
+        self.assertAlmostEqual(
+            PostScore.objects.get(post=self.posts[1]).score,
+            2 * settings.TRENDING_WEIGHTS['view'],
+            places=2,
+        )
+        trending.record({10 ** 6: 1})
+        self.assertEqual(PostScore.objects.count(), 1)
+
+    def test_feed_pages_by_score(self):
+        """Лента листается курсором по оценке."""
+        for weight, post in enumerate(self.posts, 1):
+            trending.record({post.pk: weight})
+        with self.settings(POSTS_PER_PAGE=3):
+            response = self.client.get(reverse('posts:trending'))
+            page = response.context['page_obj']
+            self.assertEqual(
+                [post.pk for post in page], [p.pk for p in self.posts[:0:-1]]
+            )
+            response = self.client.get(
+                reverse('posts:trending'),
+                {'after': page.paginator.next_cursor},
+            )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.posts[0].pk],
+        )
+        self.assertContains(response, 'Популярные группы')
+
+    def test_feed_cache_refreshes_by_interval(self):
+        """Кеш ленты не сбрасывается каждым событием, а живёт
+        TRENDING_REFRESH_INTERVAL."""
+        trending.record({self.posts[1].pk: 2, self.posts[0].pk: 1})
+
+        def first_shown():
+            content = self.client.get(reverse('posts:trending')).content
+            return min(
+                (content.decode().find(post.text), post)
+                for post in self.posts[:2]
+            )[1]
+
+        self.assertEqual(first_shown(), self.posts[1])
+        trending.record({self.posts[0].pk: 100})
+        self.assertEqual(first_shown(), self.posts[1])
+        later = time.time() + settings.TRENDING_REFRESH_INTERVAL
+        with mock.patch('posts.trending.time.time', return_value=later):
+            self.assertEqual(first_shown(), self.posts[0])
+
+    def test_stale_epoch_compacted_before_recording(self):
+        """Запись после долгого затишья сначала сжимает оценки,
+        и множитель не переполняется."""
+        first, second = self.posts[:2]
+        trending.record({first.pk: 1}, now=NOW)
+        later = NOW + 5000 * HOUR
+        trending.record({second.pk: 1}, now=later)
+        self.assertEqual(
+            set(PostScore.objects.values_list('epoch', flat=True)), {later}
+        )
+        self.assertEqual(self.ranking(), [second.pk])
+        self.assertAlmostEqual(PostScore.objects.get().score, 1)
+
+    def test_compact_command(self):
+        """compact_trending сообщает, сколько оценок удалено."""
+        trending.record({self.posts[0].pk: 0.1})
+        out = StringIO()
+        call_command('compact_trending', stdout=out)
+        self.assertIn('Удалено оценок: 2', out.getvalue())
@@ -1,17 +1,28 @@
 from http import HTTPStatus
+import json
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from ..models import Post, Group, Follow
+from core import fragments, tasks
+from core.models import Task
+
+from .. import thumbnails
+from ..models import (
+    AuthorStats, Comment, Post, Group, Follow, TimelineEntry
+)
+from ..search import DatabaseBackend, get_backend
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -167,13 +178,70 @@ class PostPagesTests(TestCase):
             author=self.author
         )
         self.author_client.get(reverse('posts:index'))
-        post.delete()
+        Post.objects.filter(pk=post.pk).update(text='Изменён в обход ORM')
         response = self.author_client.get(reverse('posts:index'))
         self.assertTrue(text in response.content.decode())
+        self.assertEqual(fragments.stats(), {'hits': 1, 'misses': 1})
         cache.clear()
         response = self.author_client.get(reverse('posts:index'))
         self.assertFalse(text in response.content.decode())
 
+    def test_feed_cache_invalidated_on_change(self):
+        """Кеш лент сбрасывается при изменении и удалении поста."""
+        feeds = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        ]
+        post = Post.objects.create(
+            text='Исходный текст', author=self.author, group=self.group
+        )
+        for url in feeds:
+            self.author_client.get(url)
+        post.text = 'Исправленный текст'
+        post.save()
+        for url in feeds:
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertContains(response, 'Исправленный текст')
+        post.delete()
+        for url in feeds:
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertNotContains(response, 'Исправленный текст')
+
+    def test_feed_cache_invalidated_on_author_and_group_change(self):
+        """Смена имени автора и slug группы обновляет ленты с их постами."""
+        Follow.objects.create(user=self.author2, author=self.author)
+        author = User.objects.get(pk=self.author.pk)
+        group = Group.objects.get(pk=self.group.pk)
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': author.username}),
+            reverse('posts:follow_index'),
+        ]
+        for url in pages:
+            self.author2_client.get(url)
+        author.first_name = 'Катерина'
+        author.save()
+        group.slug = 'new-slug'
+        group.save()
+        pages[1] = reverse('posts:group_list', kwargs={'slug': group.slug})
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.author2_client.get(url)
+                self.assertContains(response, 'Катерина')
+                self.assertContains(response, '/group/new-slug/')
+
+    def test_follow_cache_invalidated_on_new_post(self):
+        """Новый пост автора сразу виден в закешированной ленте."""
+        Follow.objects.create(user=self.author2, author=self.author3)
+        self.author2_client.get(reverse('posts:follow_index'))
+        Post.objects.create(text='Свежая запись', author=self.author3)
+        response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Свежая запись')
+
     def test_authorized_user_followes_to_other_users(self):
         """Авторизованный пользователь может подписаться на
         других пользователей."""
@@ -220,6 +288,148 @@ class PostPagesTests(TestCase):
         response4 = self.author_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response4.context['page_obj']), 0)
 
+    def test_timeline_fan_out_and_trim(self):
+        """Посты раскладываются по лентам и убираются после отписки."""
+        Follow.objects.create(user=self.author2, author=self.author3)
+        post = Post.objects.create(text='Запись ленты', author=self.author3)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.author2, post=post).exists()
+        )
+        self.author2_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author3.username})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.author2).exists()
+        )
+
+    @override_settings(TASKS_EAGER=False)
+    def test_side_effects_wait_for_worker(self):
+        """Раздача по лентам и индексация ждут воркера, а не запроса."""
+        Follow.objects.create(user=self.author2, author=self.author3)
+        # Подписка сама ставит задачи: дозаполнение ленты и популярное.
+        self.assertEqual(tasks.run_pending(), (2, 0))
+        client = Client()
+        client.force_login(self.author3)
+        client.post(
+            reverse('posts:post_create'), {'text': 'Отложенная запись'}
+        )
+        post = Post.objects.get(text='Отложенная запись')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(
+            set(Task.objects.values_list('key', flat=True)),
+            {f'fan_out:{post.pk}', f'index:{post.pk}'},
+        )
+        self.assertEqual(tasks.run_pending(), (2, 0))
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.author2, post=post).exists()
+        )
+        self.assertIn(
+            post, get_backend().filter(Post.objects.all(), 'отложенная')
+        )
+
+    def test_timeline_backfill_on_follow(self):
+        """После подписки в ленте появляются прежние посты автора."""
+        self.author2_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], self.post)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_timeline_merges_celebrity_posts_on_read(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.author2, author=self.author3)
+        post = Post.objects.create(text='Пост звезды', author=self.author3)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_merge_filters_by_followed_celebrities(self):
+        """Подмешивание фильтрует посты по популярным авторам из подписок,
+        а не по всему списку подписок."""
+        Follow.objects.create(user=self.author, author=self.author3)
+        Follow.objects.create(user=self.author2, author=self.author3)
+        Follow.objects.get_or_create(user=self.author2, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        merged = [
+            query['sql'] for query in queries
+            if '"author_id" IN (' in query['sql']
+        ]
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0].count(' IN ('), 1)
+        self.assertIn(f'"author_id" IN ({self.author3.pk})', merged[0])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_former_celebrity_posts_fanned_out(self):
+        """Посты, написанные в популярности, попадают в ленты,
+        когда подписчиков становится не больше порога."""
+        Follow.objects.create(user=self.author, author=self.author3)
+        Follow.objects.create(user=self.author2, author=self.author3)
+        post = Post.objects.create(text='Пост звезды', author=self.author3)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.filter(user=self.author, author=self.author3).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.author2, post=post).exists()
+        )
+        response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(TASKS_EAGER=False)
+    def test_backfill_skips_unfollowed_author(self):
+        """Дозаполнение ленты из очереди не возвращает посты автора,
+        от которого успели отписаться."""
+        Follow.objects.create(user=self.author2, author=self.author)
+        Follow.objects.filter(user=self.author2, author=self.author).delete()
+        tasks.run_pending()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.author2).exists()
+        )
+
+    def test_feed_uses_prebuilt_thumbnail(self):
+        """Лента показывает заранее построенные рендиции картинки."""
+        thumbnails.build(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        rendition = post.thumbnail_urls['card']
+        self.assertTrue(rendition['src'].startswith(settings.MEDIA_URL))
+        response = self.author_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, rendition['srcset'])
+
+    def test_thumbnails_refresh_follow_feed(self):
+        """Готовые рендиции сбрасывают и кеш лент подписчиков."""
+        Follow.objects.create(user=self.author2, author=self.author)
+        Post.objects.filter(pk=self.post.pk).update(thumbnails='')
+        Post.cached.invalidate(self.post)
+        response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, '<picture>')
+        thumbnails.build(self.post.pk)
+        response = self.author2_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, '<picture>')
+
+    def test_renditions_decode_source_once(self):
+        """Все ширины и форматы строятся из одного декодирования."""
+        with mock.patch(
+            'posts.thumbnails.Image.open', wraps=thumbnails.Image.open
+        ) as image_open:
+            renditions = thumbnails.render(self.post.image)
+        image_open.assert_called_once()
+        widths = settings.THUMBNAIL_SIZES['card']['widths']
+        formats = len(thumbnails.supported_formats()) + 1
+        self.assertEqual(
+            len(renditions['card']['files']), len(widths) * formats
+        )
+        self.assertEqual(
+            renditions['card']['srcset'].count('w,'), len(widths) - 1
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -261,3 +471,441 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(reverse_page=reverse_page):
                 response = self.author_client.get(reverse_page + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=5)
+    def test_numbered_pages_show_estimate(self):
+        """Номер последней страницы по оценке помечен «примерно»."""
+        response = self.author_client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+            + '?page=1'
+        )
+        self.assertTrue(response.context['page_obj'].paginator.estimated)
+        self.assertContains(response, 'примерно 2')
+
+    def test_cursor_pages(self):
+        """Листание ленты по курсорам ?after= и ?before=."""
+        for reverse_page in self.reverse_pages:
+            with self.subTest(reverse_page=reverse_page):
+                response = self.author_client.get(reverse_page)
+                paginator = response.context['page_obj'].paginator
+                self.assertIsNone(paginator.previous_cursor)
+                response = self.author_client.get(
+                    reverse_page + f'?after={paginator.next_cursor}'
+                )
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 3)
+                self.assertIsNone(page_obj.paginator.next_cursor)
+                response = self.author_client.get(
+                    reverse_page
+                    + f'?before={page_obj.paginator.previous_cursor}'
+                )
+                self.assertEqual(len(response.context['page_obj']), 10)
+                self.assertEqual(
+                    response.context['page_obj'][0].text, 'Пробный пост 13'
+                )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.author_client.get(
+            reverse('posts:index') + '?after=broken'
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class FeedQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Пробная группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(10):
+            author = User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name='Фамилия'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                text=f'Пробный пост {i}', author=author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_query_budget(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        # Сессия и пользователь дают 2 запроса, лента - ещё 1,
+        # профиль и лента подписок читают рекомендации ещё одним;
+        # остальное - чтение группы или автора мимо кеша объектов.
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 5,
+            reverse('posts:profile', kwargs={'username': 'author0'}): 8,
+            reverse('posts:follow_index'): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Kat')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        for i in range(7):
+            commenter = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {i}'
+            )
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertEqual(comments[0].text, 'Комментарий 6')
+        self.assertContains(response, 'data-more-comments')
+
+    def test_more_comments_fragment(self):
+        """Фрагмент отдаёт следующую порцию комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        cursor = response.context['comments'].paginator.next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+            + f'?after={cursor}'
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 1', 'Комментарий 0'],
+        )
+        self.assertNotContains(response, 'data-more-comments')
+
+    def test_comment_authors_loaded_in_one_query(self):
+        """Авторы комментариев выбираются вместе с комментариями."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+
+@override_settings(POSTS_PER_PAGE=2)
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Kat')
+        cls.match = Post.objects.create(
+            text='Котики и котики, снова котики', author=cls.author
+        )
+        for i in range(3):
+            Post.objects.create(
+                text=f'Пост {i} про котиков и собак', author=cls.author
+            )
+        Post.objects.create(text='Только собаки', author=cls.author)
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+
+    def found(self, query):
+        return list(self.search(query).context['page_obj'])
+
+    def test_results_ranked_and_paged_by_cursor(self):
+        """Выдача ранжирована и листается курсором с сохранением запроса."""
+        response = self.search('котик')
+        first = list(response.context['page_obj'])
+        self.assertEqual(first[0], self.match)
+        self.assertEqual(len(first), 2)
+        cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA')
+        response = self.search('котик', after=cursor)
+        second = list(response.context['page_obj'])
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+        self.assertIsNone(response.context['page_obj'].paginator.next_cursor)
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.create(text='Редкое слово', author=self.author)
+        self.assertEqual(self.found('редкое'), [post])
+        post.text = 'Другое слово'
+        post.save()
+        self.assertEqual(self.found('редкое'), [])
+        self.assertEqual(self.found('другое'), [post])
+        post.delete()
+        self.assertEqual(self.found('другое'), [])
+
+    def test_query_syntax_is_not_passed_to_index(self):
+        """Операторы и кавычки в запросе не ломают поиск."""
+        response = self.search('котики" ^* (')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(self.match, list(response.context['page_obj']))
+
+    def test_backend_is_pluggable(self):
+        """Бэкенд выбирается настройкой SEARCH_BACKEND."""
+        with mock.patch.object(
+            DatabaseBackend, 'search', return_value=[(self.match.pk, 0)]
+        ), override_settings(SEARCH_BACKEND='posts.search.DatabaseBackend'):
+            response = self.search('что угодно')
+        self.assertEqual(list(response.context['page_obj']), [self.match])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост, "{i}"', author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streamed_in_chunks(self):
+        """CSV собирается порциями по pk с автором и группой."""
+        with mock.patch('posts.export.CHUNK_SIZE', 2):
+            response = self.client.get(reverse('posts:export'))
+            lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], 'id,created,author,group,text,image')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[2].startswith(f'{self.posts[1].pk},'))
+        self.assertIn('writer,group,"Пост, ""1""",', lines[2])
+
+    def test_ndjson_filtered(self):
+        """Фильтры автора и группы, формат NDJSON."""
+        response = self.client.get(
+            reverse('posts:export'), {'group': 'group', 'format': 'ndjson'}
+        )
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        ids = [
+            json.loads(line)['id']
+            for line in self.read(response).splitlines()
+        ]
+        self.assertEqual(ids, [self.posts[1].pk, self.posts[3].pk])
+
+    def test_staff_only(self):
+        """Выгрузка доступна только персоналу."""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_admin_action(self):
+        """Действие в админке выгружает выбранные посты."""
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export_csv',
+                '_selected_action': [self.posts[0].pk, self.posts[4].pk],
+            },
+        )
+        lines = self.read(response).splitlines()
+        self.assertEqual(len(lines), 3)
+
+
+class BulkFollowTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text=f'Пост {author}', author=author)
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def post(self, name, usernames):
+        return self.client.post(
+            reverse(f'posts:{name}'), {'usernames': usernames}
+        )
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_follow_many(self):
+        """Подписка пачкой: статус по каждому имени, счётчики и лента."""
+        response = self.post(
+            'follow_bulk', 'author0, author1\nauthor2 reader ghost author1'
+        )
+        self.assertEqual(response.json()['results'], {
+            'author0': 'already_following',
+            'author1': 'followed',
+            'author2': 'followed',
+            'reader': 'self',
+            'ghost': 'not_found',
+        })
+        self.assertEqual(self.reader.follower.count(), 3)
+        self.assertEqual(self.stats(self.reader).following_count, 3)
+        self.assertEqual(self.stats(self.authors[2]).followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_follow_many_queries(self):
+        """Число запросов не зависит от числа авторов."""
+        with CaptureQueriesContext(connection) as one:
+            self.post('follow_bulk', 'author1')
+        self.post('unfollow_bulk', 'author1')
+        with CaptureQueriesContext(connection) as two:
+            self.post('follow_bulk', 'author1 author2')
+        self.assertEqual(len(one), len(two))
+
+    def test_unfollow_many(self):
+        """Отписка пачкой убирает посты авторов из ленты."""
+        self.post('follow_bulk', 'author1')
+        response = self.post('unfollow_bulk', 'author0 author1 author2')
+        self.assertEqual(response.json()['results'], {
+            'author0': 'unfollowed',
+            'author1': 'unfollowed',
+            'author2': 'not_following',
+        })
+        self.assertFalse(self.reader.follower.exists())
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    def test_unfollow_many_queries(self):
+        """Число запросов при отписке не зависит от числа авторов."""
+        self.post('follow_bulk', 'author1 author2')
+        with CaptureQueriesContext(connection) as one:
+            self.post('unfollow_bulk', 'author1')
+        self.post('follow_bulk', 'author1')
+        with CaptureQueriesContext(connection) as two:
+            self.post('unfollow_bulk', 'author1 author2')
+        self.assertEqual(len(one), len(two))
+
+    @override_settings(FOLLOW_BULK_LIMIT=2)
+    def test_limit_and_method(self):
+        """Слишком длинный список и GET отклоняются."""
+        response = self.post('follow_bulk', 'author0 author1 author2')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('usernames', response.json()['errors'])
+        response = self.client.get(reverse('posts:follow_bulk'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(username='writer')
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+            for i in range(3)
+        ]
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.groups[0]
+        )
+        Comment.objects.create(post=cls.post, author=cls.author, text='Да')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        return self.client.get(
+            reverse(f'admin:posts_{model}_changelist'), params
+        )
+
+    def test_group_select_renders_only_current_group(self):
+        """Редактируемая группа - автодополнение без списка всех групп."""
+        response = self.changelist('post')
+        self.assertContains(response, 'Группа 0')
+        self.assertNotContains(response, 'Группа 1')
+
+    def test_changelist_queries_per_row(self):
+        """Автор и группа подгружаются JOIN, подпись группы
+        в автодополнении берётся из них: запросов не больше со строками."""
+        self.changelist('post')
+        with CaptureQueriesContext(connection) as few:
+            self.changelist('post')
+        for i in range(5):
+            Post.objects.create(
+                text=f'Ещё {i}', author=self.author, group=self.groups[1]
+            )
+        with CaptureQueriesContext(connection) as many:
+            self.changelist('post')
+        self.assertEqual(len(many), len(few))
+
+    def test_search_by_related_username(self):
+        """Комментарии и подписки ищутся по имени пользователя."""
+        response = self.changelist('comment', q='writer')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.changelist('comment', q='nobody')
+        self.assertEqual(response.context['cl'].result_count, 0)
+        response = self.changelist('follow', q='writer')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_search_by_id_without_join_or_like(self):
+        """Поиск подставляет id пользователя и поста: условие
+        без полей пользователей и LIKE по тексту."""
+        for model, term in (
+            ('comment', 'writer'), ('comment', str(self.post.pk)),
+            ('follow', 'admin'),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.changelist(model, q=term)
+            self.assertEqual(response.context['cl'].result_count, 1)
+            searches = [
+                q['sql'] for q in queries
+                if f'"posts_{model}"' in q['sql'] and 'WHERE' in q['sql']
+            ]
+            self.assertTrue(searches)
+            for sql in searches:
+                where = sql.split(' WHERE ', 1)[1]
+                self.assertNotIn('LIKE', where)
+                self.assertNotIn('"auth_user"', where)
+        response = self.changelist('comment', q='Да')
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_date_hierarchy_without_distinct(self):
+        """date_hierarchy строится по MIN/MAX, без DISTINCT по таблице."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist('post')
+        self.assertFalse([q for q in queries if 'DISTINCT' in q['sql']])
+        self.assertContains(
+            response, f'created__year={self.post.created.year}'
+        )
@@ -0,0 +1,213 @@
+import hashlib
+import io
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core import metrics
+from core.tasks import task
+
+from . import feeds, timeline
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def supported_formats():
+    """Современные форматы из THUMBNAIL_FORMATS, которые умеет Pillow."""
+    Image.init()
+    return [
+        fmt for fmt in settings.THUMBNAIL_FORMATS if fmt.upper() in Image.SAVE
+    ]
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, fmt.upper(), quality=settings.THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def _store(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    name = default_storage.save(name, ContentFile(content))
+    return default_storage.url(name)
+
+
+def _folder(name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'cache/renditions/{digest[:2]}/{digest}'
+
+
+def _hash_name(image):
+    # Хеш исходника лежит рядом с рендициями, а не в общем файле:
+    # warm_thumbnails читает и пишет его только для своего поста.
+    return f'{_folder(image)}/source.sha1'
+
+
+def read_hash(image):
+    name = _hash_name(image)
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name) as stored:
+        return stored.read().decode()
+
+
+def write_hash(image, digest):
+    _store(_hash_name(image), digest.encode())
+
+
+def render(image):
+    """Строит все рендиции из THUMBNAIL_SIZES за одно декодирование.
+
+    Для каждого размера картинка обрезается по его пропорциям, затем
+    уменьшается до каждой ширины и кодируется в каждый поддерживаемый
+    формат. Возвращает {имя: {'src', 'srcset', 'sources', 'files'}}.
+    """
+    name = image.name if hasattr(image, 'name') else str(image)
+    folder = _folder(name)
+    with default_storage.open(name) as source:
+        decoded = Image.open(source)
+        decoded.load()
+    decoded = ImageOps.exif_transpose(decoded)
+    if decoded.mode not in ('RGB', 'RGBA'):
+        decoded = decoded.convert(
+            'RGBA' if 'transparency' in decoded.info else 'RGB'
+        )
+    formats = [*supported_formats(), 'jpeg']
+    result = {}
+    for size, spec in settings.THUMBNAIL_SIZES.items():
+        width, height = map(int, spec['geometry'].split('x'))
+        cropped = ImageOps.fit(decoded, (width, height), Image.LANCZOS)
+        srcsets = {fmt: [] for fmt in formats}
+        files = []
+        for target in sorted(spec['widths']):
+            resized = cropped.resize(
+                (target, round(target * height / width)), Image.LANCZOS
+            )
+            for fmt in formats:
+                url = _store(
+                    f'{folder}/{size}-{target}.{fmt}', _encode(resized, fmt)
+                )
+                srcsets[fmt].append(f'{url} {target}w')
+                files.append(url)
+        result[size] = {
+            'src': srcsets['jpeg'][-1].split()[0],
+            'srcset': ', '.join(srcsets['jpeg']),
+            'sources': [
+                {'type': MIME_TYPES[fmt], 'srcset': ', '.join(srcsets[fmt])}
+                for fmt in formats[:-1]
+            ],
+            'files': files,
+        }
+    return result
+
+
+@task
+def build(post_id):
+    """Создаёт миниатюры поста и сохраняет их адреса в Post.thumbnails."""
+    try:
+        post = Post.objects.only('image', 'author', 'group').get(pk=post_id)
+    except Post.DoesNotExist:
+        return
+    if not post.image:
+        return
+    try:
+        urls = render(post.image)
+    except Exception:
+        logger.warning('Не удалось создать миниатюры поста %s', post_id,
+                       exc_info=True)
+        return
+    # Картинку могли заменить, пока строились миниатюры.
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(urls)
+    )
+    Post.cached.invalidate(post)
+    feeds.bump_post(post)
+    # Ленты подписок тоже показывают <picture> поста.
+    timeline.touch(post.author_id)
+
+
+def schedule(post):
+    """Ставит построение миниатюр в очередь задач."""
+    metrics.count('thumbnails')
+    build.delay(post.pk, key=f'thumbnails:{post.pk}')
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as image:
+        for chunk in iter(lambda: image.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _media_path(url):
+    return default_storage.path(url[len(settings.MEDIA_URL):])
+
+
+def is_fresh(source, urls, known_hash):
+    """Проверяет, что миниатюры не старше исходника.
+
+    Сначала сравниваются mtime; если исходник новее, но его хеш совпадает
+    с записанным при прошлом прогоне, файл лишь «потрогали» и миниатюры
+    по-прежнему годятся. Возвращает (свежие ли, хеш или None).
+    """
+    if set(urls) != set(settings.THUMBNAIL_SIZES) or not all(
+        isinstance(spec, dict) for spec in urls.values()
+    ):
+        return False, None
+    paths = [
+        _media_path(url) for spec in urls.values() for url in spec['files']
+    ]
+    if not all(os.path.exists(path) for path in paths):
+        return False, None
+    source_mtime = os.path.getmtime(source)
+    if all(os.path.getmtime(path) >= source_mtime for path in paths):
+        return True, known_hash
+    digest = file_hash(source)
+    return digest == known_hash, digest
+
+
+def warm(task):
+    """Задача warm_thumbnails для процесса пула.
+
+    task: (post_id, image, thumbnails, dry_run). Возвращает
+    (post_id, статус, адреса); статус - 'fresh', 'built',
+    'would_build' или 'failed'. Хеш исходника обновляется в файле
+    рядом с рендициями.
+    """
+    post_id, image, thumbnails, dry_run = task
+    urls = json.loads(thumbnails) if thumbnails else {}
+    try:
+        source = default_storage.path(image)
+        known_hash = read_hash(image)
+        fresh, digest = is_fresh(source, urls, known_hash)
+        if fresh:
+            status = 'fresh'
+        elif dry_run:
+            return post_id, 'would_build', urls
+        else:
+            urls = render(image)
+            digest = digest or file_hash(source)
+            status = 'built'
+        if not dry_run and digest and digest != known_hash:
+            write_hash(image, digest)
+        return post_id, status, urls
+    except Exception:
+        logger.warning('Не удалось создать миниатюры поста %s', post_id,
+                       exc_info=True)
+        return post_id, 'failed', urls
@@ -0,0 +1,290 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from core import bulk, fragments
+from core.paginator import CursorPaginator
+
+from . import feeds, graph
+from .models import AuthorStats, Follow, Post, PostQuerySet, TimelineEntry
+
+
+def celebrity_ids(author_ids):
+    """Авторы, чьи посты не раздаются по лентам, а подмешиваются
+    при чтении: у них больше TIMELINE_FANOUT_LIMIT подписчиков."""
+    return set(
+        AuthorStats.objects.filter(
+            user__in=author_ids,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        ).values_list('user', flat=True)
+    )
+
+
+def _celebrities_key():
+    return f'timeline:celebrities:{settings.TIMELINE_FANOUT_LIMIT}'
+
+
+def celebrities():
+    """Отсортированные id всех популярных авторов.
+
+    Их немного, поэтому массив целиком лежит в кеше, и лента подписок
+    пересекает его со своим списком авторов в памяти, не отправляя
+    этот список в базу. Сбрасывается forget_celebrities(), когда
+    кто-то пересекает порог.
+    """
+    ids = cache.get(_celebrities_key())
+    if ids is None:
+        ids = array('I', AuthorStats.objects.filter(
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        ).order_by('user').values_list('user', flat=True))
+        cache.set(
+            _celebrities_key(), ids, settings.TIMELINE_CELEBRITIES_TIMEOUT
+        )
+    return ids
+
+
+def forget_celebrities():
+    cache.delete(_celebrities_key())
+
+
+def new_celebrities(author_ids):
+    """Авторы, у которых подписчиков стало ровно TIMELINE_FANOUT_LIMIT
+    + 1: после подписки они стали популярными."""
+    return set(
+        AuthorStats.objects.filter(
+            user__in=author_ids,
+            followers_count=settings.TIMELINE_FANOUT_LIMIT + 1,
+        ).values_list('user', flat=True)
+    )
+
+
+def former_celebrities(author_ids):
+    """Авторы, у которых подписчиков стало ровно TIMELINE_FANOUT_LIMIT:
+    после отписки они перестали быть популярными."""
+    return set(
+        AuthorStats.objects.filter(
+            user__in=author_ids,
+            followers_count=settings.TIMELINE_FANOUT_LIMIT,
+        ).values_list('user', flat=True)
+    )
+
+
+def _entries(users, posts):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            created=post.created,
+        )
+        for user_id in users
+        for post in posts
+    ]
+
+
+def _follower_batches(author_id):
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(user_id)
+        if len(batch) == settings.TIMELINE_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in celebrity_ids([post.author_id]):
+        fragments.bump(feeds.CELEBRITIES)
+        return
+    for batch in _follower_batches(post.author_id):
+        TimelineEntry.objects.bulk_create(
+            _entries(batch, [post]), ignore_conflicts=True
+        )
+        fragments.bump(*(feeds.follow(user_id) for user_id in batch))
+
+
+def fan_out_author(author_id):
+    """Раскладывает все посты автора по лентам подписчиков одним
+    INSERT ... SELECT.
+
+    Нужна, когда автор перестал быть популярным: его посты, написанные
+    раньше, в ленты не попадали, а подмешивать их при чтении больше
+    не будут.
+    """
+    if author_id in celebrity_ids([author_id]):
+        return
+    entries = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {entries} (user_id, post_id, author_id, created)
+            SELECT f.user_id, p.id, p.author_id, p.created
+            FROM {Follow._meta.db_table} f
+            JOIN {Post._meta.db_table} p ON p.author_id = f.author_id
+            WHERE f.author_id = %s AND NOT EXISTS (
+                SELECT 1 FROM {entries} t
+                WHERE t.user_id = f.user_id AND t.post_id = p.id
+            )
+            ''',
+            [author_id],
+        )
+    fragments.bump(feeds.CELEBRITIES)
+    for batch in _follower_batches(author_id):
+        fragments.bump(*(feeds.follow(user_id) for user_id in batch))
+
+
+def fan_out_posts(post_ids):
+    """Раскладывает уже записанные посты по лентам подписчиков
+    INSERT ... SELECT на порцию.
+
+    Нужна после загрузки постов мимо сигналов, например import_posts.
+    Счётчики подписчиков должны быть уже пересчитаны.
+    """
+    entries = TimelineEntry._meta.db_table
+    authors = set()
+    for batch in bulk.batches(post_ids, settings.TIMELINE_BATCH_SIZE):
+        params = ', '.join(['%s'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                INSERT INTO {entries} (user_id, post_id, author_id, created)
+                SELECT f.user_id, p.id, p.author_id, p.created
+                FROM {Post._meta.db_table} p
+                JOIN {Follow._meta.db_table} f ON f.author_id = p.author_id
+                WHERE p.id IN ({params}) AND p.author_id NOT IN (
+                    SELECT user_id FROM {AuthorStats._meta.db_table}
+                    WHERE followers_count > %s
+                ) AND NOT EXISTS (
+                    SELECT 1 FROM {entries} t
+                    WHERE t.user_id = f.user_id AND t.post_id = p.id
+                )
+                ''',
+                [*batch, settings.TIMELINE_FANOUT_LIMIT],
+            )
+        authors.update(Post.objects.filter(pk__in=batch).values_list(
+            'author_id', flat=True
+        ).distinct())
+    for author_id in authors:
+        touch(author_id)
+
+
+def touch(author_id):
+    """Обновляет ленты подписчиков после правки или удаления поста."""
+    if author_id in celebrity_ids([author_id]):
+        fragments.bump(feeds.CELEBRITIES)
+        return
+    for batch in _follower_batches(author_id):
+        fragments.bump(*(feeds.follow(user_id) for user_id in batch))
+
+
+def backfill(user_id, *author_ids):
+    """Добавляет в ленту подписчика посты авторов после подписки.
+
+    Работает в фоне, поэтому авторы, от которых он успел отписаться,
+    пропускаются.
+    """
+    authors = set(Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).values_list('author_id', flat=True)) - celebrity_ids(author_ids)
+    if not authors:
+        fragments.bump(feeds.follow(user_id))
+        return
+    posts = Post.objects.filter(author_id__in=authors).only(
+        'id', 'author_id', 'created'
+    )
+    batch = []
+    for post in posts.iterator():
+        batch.append(post)
+        if len(batch) == settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(
+                _entries([user_id], batch), ignore_conflicts=True
+            )
+            batch = []
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], batch), ignore_conflicts=True
+    )
+    fragments.bump(feeds.follow(user_id))
+
+
+def trim(user_id, *author_ids):
+    """Убирает из ленты посты авторов после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+    fragments.bump(feeds.follow(user_id))
+
+
+def rebuild():
+    """Собирает все ленты заново одним INSERT ... SELECT.
+
+    Нужна после bulk_create подписок и постов, которые не посылают
+    сигналов. Счётчики подписчиков должны быть уже пересчитаны:
+    по ним отбираются популярные авторы.
+    """
+    TimelineEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {TimelineEntry._meta.db_table}
+                (user_id, post_id, author_id, created)
+            SELECT f.user_id, p.id, p.author_id, p.created
+            FROM {Follow._meta.db_table} f
+            JOIN {Post._meta.db_table} p ON p.author_id = f.author_id
+            WHERE f.author_id NOT IN (
+                SELECT user_id FROM {AuthorStats._meta.db_table}
+                WHERE followers_count > %s
+            )
+            ''',
+            [settings.TIMELINE_FANOUT_LIMIT],
+        )
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорная пагинация ленты подписок.
+
+    Посты обычных авторов читаются из материализованной ленты,
+    посты популярных авторов подмешиваются из object_list при чтении.
+    Каких именно, решается в памяти пересечением celebrities()
+    с отсортированным списком подписок из графа.
+    """
+    entry_key = ('created', 'post_id')
+
+    def __init__(self, object_list, per_page, user):
+        super().__init__(object_list, per_page)
+        self.user = user
+
+    def fetch(self, created, pk, forward=True):
+        limit = self.per_page + 1
+        entries = self.seek(
+            TimelineEntry.objects.filter(user=self.user),
+            created, pk, forward, key=self.entry_key,
+        ).select_related('post__author', 'post__group').only(
+            'created', 'post',
+            *(f'post__{field}' for field in PostQuerySet.FEED_FIELDS),
+            'post__author', 'post__group',
+        )
+        posts = {entry.post_id: entry.post for entry in entries[:limit]}
+        following = graph.following(self.user.pk)
+        followed = [
+            author_id for author_id in celebrities()
+            if graph.contains(following, author_id)
+        ]
+        if followed:
+            merged = self.seek(
+                self.object_list.filter(author__in=followed),
+                created, pk, forward,
+            )
+            posts.update((post.id, post) for post in merged[:limit])
+        items = sorted(
+            posts.values(),
+            key=lambda post: (post.created, post.id),
+            reverse=forward,
+        )
+        return items[:limit]
@@ -0,0 +1,329 @@
+"""Перенос постов, комментариев и подписок между инсталляциями в NDJSON.
+
+Каждая строка - {"model": ..., "pk": ..., "fields": {...}}, как у
+сериализаторов Django. Ссылки записываются естественными ключами:
+пользователи - username, группы - slug, посты - uid. pk из файла нужен
+только выгрузке для продолжения с места остановки: в базе назначения
+у постов и комментариев свои pk, иначе они совпадали бы с чужими
+строками, а uid переносится как есть.
+"""
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from core import bulk, fragments
+
+from . import counters, feeds, graph, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+EXPORTS = {
+    'posts.post': (Post, {
+        'uid': 'uid',
+        'text': 'text',
+        'created': 'created',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }),
+    'posts.comment': (Comment, {
+        'uid': 'uid',
+        'post': 'post__uid',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'posts.follow': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+def records(label, after=0, chunk_size=2000):
+    """Записи модели с pk больше after, по возрастанию pk."""
+    model, fields = EXPORTS[label]
+    rows = model.objects.filter(pk__gt=after).order_by('pk').values_list(
+        'pk', *fields.values()
+    )
+    for pk, *values in rows.iterator(chunk_size=chunk_size):
+        yield {'model': label, 'pk': pk, 'fields': dict(zip(fields, values))}
+
+
+class Encoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder режет их до миллисекунд,
+    и посты, созданные подряд, меняли бы порядок в лентах."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def dumps(record):
+    return json.dumps(record, cls=Encoder, ensure_ascii=False)
+
+
+class ChunkWriter:
+    """Дописывает файл порциями и сообщает смещение после каждой.
+
+    В gzip каждая порция - отдельный член архива, поэтому файл можно
+    обрезать по любому сохранённому смещению и продолжить запись.
+    """
+
+    def __init__(self, path, compress, offset=0):
+        self.compress = compress
+        self.file = open(path, 'r+b' if offset else 'wb')
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def write(self, lines):
+        data = ''.join(lines).encode()
+        if self.compress:
+            data = gzip.compress(data)
+        self.file.write(data)
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def open_lines(path):
+    """Строки файла NDJSON, сжатого gzip или нет."""
+    with open(path, 'rb') as probe:
+        compressed = probe.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+# Что импортёр добавил и что после загрузки нужно обновить.
+TOUCHED = ('feeds', 'users', 'posts', 'commented', 'follows')
+
+
+class Importer:
+    """Записывает порции записей одной модели.
+
+    Посты и комментарии узнаются по uid; новые получают pk базы
+    назначения. Недостающие пользователи и группы создаются, комментарии
+    к постам, которых нет в базе, пропускаются.
+
+    Запись идёт мимо сигналов, поэтому импортёр запоминает, что
+    добавил, и refresh() после загрузки обновляет счётчики, ленты,
+    поисковый индекс и кеш только для этого: стоимость зависит
+    от файла, а не от размера базы. Добавленное дописывается
+    в journal, чтобы загрузка с --resume обновила и то, что успела
+    записать прошлая.
+    """
+
+    def __init__(self, journal=None, resume=False):
+        self.skipped = 0
+        self.journal = journal
+        self.touched = {name: set() for name in TOUCHED}
+        self.delta = None
+        if journal and os.path.exists(journal):
+            if resume:
+                with open(journal) as lines:
+                    for line in lines:
+                        self.merge(json.loads(line))
+            else:
+                os.remove(journal)
+
+    def merge(self, delta):
+        for name, values in delta.items():
+            self.touched[name].update(
+                tuple(value) if isinstance(value, list) else value
+                for value in values
+            )
+
+    def user_ids(self, usernames):
+        usernames = set(usernames)
+        found = dict(User.objects.filter(
+            username__in=usernames
+        ).values_list('username', 'id'))
+        missing = usernames - found.keys()
+        if missing:
+            User.objects.bulk_create(
+                [User(username=name, password='!') for name in missing],
+                ignore_conflicts=True,
+            )
+            created = dict(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'id'))
+            self.delta['users'].update(created.values())
+            found.update(created)
+        return found
+
+    def group_ids(self, slugs):
+        slugs = set(slugs) - {None}
+        found = dict(Group.objects.filter(
+            slug__in=slugs
+        ).values_list('slug', 'id'))
+        missing = slugs - found.keys()
+        if missing:
+            Group.objects.bulk_create(
+                [Group(slug=slug, title=slug) for slug in missing],
+                ignore_conflicts=True,
+            )
+            found.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'id'))
+        return found
+
+    def post_ids(self, uids):
+        """id постов по uid."""
+        return dict(Post.objects.filter(
+            uid__in=set(uids)
+        ).values_list('uid', 'id'))
+
+    def posts(self, batch):
+        users = self.user_ids(row['fields']['author'] for row in batch)
+        groups = self.group_ids(row['fields']['group'] for row in batch)
+        new = {uuid.UUID(row['fields']['uid']): row['fields'] for row in batch}
+        for uid in self.post_ids(new):
+            del new[uid]
+        rows = []
+        for uid, fields in new.items():
+            author_id = users[fields['author']]
+            group_id = groups.get(fields['group'])
+            rows.append((
+                bulk.db_uuid(uid),
+                bulk.db_datetime(parse_datetime(fields['created'])),
+                fields['text'], group_id, author_id, fields['image'], '', 0,
+            ))
+            self.delta['feeds'].add(feeds.author(author_id))
+            if group_id:
+                self.delta['feeds'].add(feeds.group(group_id))
+            self.delta['users'].add(author_id)
+        self.delta['feeds'].add(feeds.INDEX)
+        # Дата из файла пишется как есть: bulk_create подставил бы
+        # вместо неё текущую из auto_now_add.
+        saved = bulk.insert_rows(Post, (
+            'uid', 'created', 'text', 'group', 'author', 'image',
+            'thumbnails', 'comment_count',
+        ), rows)
+        self.delta['posts'].update(self.post_ids(new).values())
+        return saved
+
+    def comments(self, batch):
+        users = self.user_ids(row['fields']['author'] for row in batch)
+        posts = self.post_ids(
+            uuid.UUID(row['fields']['post']) for row in batch
+        )
+        new = {}
+        for row in batch:
+            fields = row['fields']
+            post_id = posts.get(uuid.UUID(fields['post']))
+            if post_id is None:
+                self.skipped += 1
+                continue
+            new[uuid.UUID(fields['uid'])] = (
+                post_id, users[fields['author']],
+                parse_datetime(fields['created']), fields['text'],
+            )
+        for uid in Comment.objects.filter(
+            uid__in=new
+        ).values_list('uid', flat=True):
+            del new[uid]
+        self.delta['commented'].update(
+            post_id for post_id, *_ in new.values()
+        )
+        return bulk.insert_rows(Comment, (
+            'uid', 'post', 'author', 'created', 'text',
+        ), [
+            (bulk.db_uuid(uid), post_id, author_id,
+             bulk.db_datetime(created), text)
+            for uid, (post_id, author_id, created, text) in new.items()
+        ])
+
+    def follows(self, batch):
+        users = self.user_ids(
+            name for row in batch
+            for name in (row['fields']['user'], row['fields']['author'])
+        )
+        pairs = {
+            (users[row['fields']['user']], users[row['fields']['author']])
+            for row in batch
+        }
+        pairs -= set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs],
+            ignore_conflicts=True,
+        )
+        self.delta['follows'].update(pairs)
+        for pair in pairs:
+            self.delta['users'].update(pair)
+            self.delta['feeds'].add(feeds.follow(pair[0]))
+        return len(pairs)
+
+    def refresh(self):
+        """Обновляет всё, что зависит от загруженных строк."""
+        touched = self.touched
+        with transaction.atomic():
+            counters.recount_authors(touched['users'])
+            counters.recount_posts(touched['commented'])
+        # Новые подписки получают посты авторов, включая загруженные,
+        # затем новые посты раздаются остальным подписчикам.
+        follows = {}
+        for user_id, author_id in touched['follows']:
+            follows.setdefault(user_id, []).append(author_id)
+        for user_id, author_ids in follows.items():
+            timeline.backfill(user_id, *author_ids)
+        posts = sorted(touched['posts'])
+        timeline.fan_out_posts(posts)
+        search.get_backend().index_many(posts)
+        fragments.bump(*touched['feeds'])
+        graph.forget(*{user_id for user_id, _ in touched['follows']})
+        if self.journal and os.path.exists(self.journal):
+            os.remove(self.journal)
+
+    builders = {
+        'posts.post': 'posts',
+        'posts.comment': 'comments',
+        'posts.follow': 'follows',
+    }
+
+    def save(self, label, batch):
+        """Сохраняет порцию; уже существующие строки пропускаются.
+
+        Возвращает число новых строк.
+        """
+        self.delta = {name: set() for name in TOUCHED}
+        with transaction.atomic():
+            saved = getattr(self, self.builders[label])(batch)
+            # Журнал пишется до фиксации: лишняя запись в нём безвредна,
+            # а пропущенная оставила бы строки без лент и счётчиков.
+            if self.journal:
+                with open(self.journal, 'a') as journal:
+                    journal.write(json.dumps({
+                        name: list(values)
+                        for name, values in self.delta.items() if values
+                    }) + '\n')
+        self.merge(self.delta)
+        return saved
+
+
+def load_checkpoint(path, default):
+    if path and os.path.exists(path):
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+    return default
+
+
+def save_checkpoint(path, state):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as tmp:
+        json.dump(state, tmp)
+    os.replace(tmp_path, path)
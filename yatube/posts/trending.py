@@ -0,0 +1,219 @@
+"""Популярные посты и группы с затуханием во времени.
+
+Событие с весом w в момент t прибавляет к оценке
+w * 2 ** ((t - epoch) / TRENDING_HALF_LIFE). Пока у всех строк один
+epoch, порядок по score совпадает с порядком по затухшей сумме
+sum(w * 2 ** ((t - now) / TRENDING_HALF_LIFE)) в любой момент now,
+поэтому старые оценки не пересчитываются. compact() переносит epoch
+вперёд, чтобы множители не росли без предела, и удаляет остывшие строки;
+record() вызывает её сам, когда epoch старше TRENDING_COMPACT_INTERVAL.
+
+Комментарии и подписки учитываются сразу, просмотры копятся в процессе
+и уходят в базу пачкой. Кеш ленты от событий не сбрасывается, а живёт
+TRENDING_REFRESH_INTERVAL секунд - см. refresh_key().
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Power
+
+from core.paginator import CursorPaginator, pack_cursor, unpack_cursor
+
+from . import tasks
+from .models import GroupScore, Post, PostQuerySet, PostScore
+
+
+def _decay(now, epoch):
+    return 2 ** ((now - epoch) / settings.TRENDING_HALF_LIFE)
+
+
+def refresh_key(now=None):
+    """Часть ключа кеша ленты, которая меняется раз
+    в TRENDING_REFRESH_INTERVAL секунд.
+
+    Оценки меняются на каждом просмотре, и сброс кеша на каждое
+    событие делал бы его бесполезным.
+    """
+    return int((now or time.time()) // settings.TRENDING_REFRESH_INTERVAL)
+
+
+def current_epoch(model, now):
+    epoch = model.objects.aggregate(epoch=Max('epoch'))['epoch']
+    return now if epoch is None else epoch
+
+
+def add(model, weights, now=None):
+    """Прибавляет веса {pk: вес} к оценкам, заводя недостающие строки.
+
+    Запросов - по одному на каждый разный вес, а не на каждую строку.
+    """
+    weights = {pk: weight for pk, weight in weights.items() if weight}
+    if not weights:
+        return
+    now = now or time.time()
+    existing = set(model.objects.filter(
+        pk__in=weights
+    ).values_list('pk', flat=True))
+    by_weight = {}
+    for pk in existing:
+        by_weight.setdefault(weights[pk], []).append(pk)
+    growth = Power(
+        Value(2.0), (Value(now) - F('epoch')) / settings.TRENDING_HALF_LIFE
+    )
+    for weight, pks in by_weight.items():
+        model.objects.filter(pk__in=pks).update(
+            score=F('score') + growth * weight
+        )
+    missing = weights.keys() - existing
+    if missing:
+        epoch = current_epoch(model, now)
+        # Строку, заведённую параллельно, не перезаписываем: её
+        # вес потеряется, для популярного это несущественно.
+        model.objects.bulk_create([
+            model(pk=pk, score=weights[pk] * _decay(now, epoch), epoch=epoch)
+            for pk in missing
+        ], ignore_conflicts=True)
+
+
+def record(post_weights, now=None):
+    """Учитывает веса {post_id: вес} у постов и их групп.
+
+    Посты, удалённые до записи, пропускаются. Если epoch устарел,
+    оценки сначала сжимаются: иначе множитель 2 ** ((now - epoch) /
+    TRENDING_HALF_LIFE) рос бы без предела и переполнился.
+    """
+    now = now or time.time()
+    epoch = PostScore.objects.values_list('epoch', flat=True).first()
+    if epoch is not None and (
+        now - epoch > settings.TRENDING_COMPACT_INTERVAL
+    ):
+        compact(now)
+    found, groups = {}, Counter()
+    for post_id, group_id in Post.objects.filter(
+        pk__in=post_weights
+    ).values_list('pk', 'group_id'):
+        found[post_id] = post_weights[post_id]
+        if group_id is not None:
+            groups[group_id] += post_weights[post_id]
+    with transaction.atomic():
+        add(PostScore, found, now)
+        add(GroupScore, groups, now)
+
+
+def record_follow(author_id):
+    """Новая подписка поднимает последний пост автора."""
+    post_id = Post.objects.filter(author_id=author_id).order_by(
+        '-created', '-id'
+    ).values_list('pk', flat=True).first()
+    if post_id is not None:
+        record({post_id: settings.TRENDING_WEIGHTS['follow']})
+
+
+class ViewBuffer:
+    """Просмотры постов, накопленные в процессе до отправки в базу."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.views = Counter()
+        self.total = 0
+        self.started = time.monotonic()
+
+    def add(self, post_id):
+        """Считает просмотр; когда пора в базу, отдаёт накопленное."""
+        with self.lock:
+            self.views[post_id] += 1
+            self.total += 1
+            due = (
+                self.total >= settings.TRENDING_VIEW_BATCH
+                or time.monotonic() - self.started
+                >= settings.TRENDING_VIEW_INTERVAL
+            )
+            if not due:
+                return None
+            views = self.views
+            self.reset()
+        return views
+
+
+buffer = ViewBuffer()
+
+
+def record_view(post_id):
+    flushed = buffer.add(post_id)
+    if flushed:
+        tasks.record_views.delay(list(flushed.items()))
+
+
+def compact(now=None):
+    """Переносит epoch всех оценок на now и удаляет те, что остыли
+    ниже TRENDING_MIN_SCORE. Возвращает число удалённых строк."""
+    now = now or time.time()
+    dropped = 0
+    for model in (PostScore, GroupScore):
+        with transaction.atomic():
+            model.objects.update(
+                score=F('score') * Power(
+                    Value(2.0),
+                    (F('epoch') - Value(now)) / settings.TRENDING_HALF_LIFE,
+                ),
+                epoch=now,
+            )
+            dropped += model.objects.filter(
+                score__lt=settings.TRENDING_MIN_SCORE
+            ).delete()[0]
+    return dropped
+
+
+def posts():
+    """Популярные посты для нумерованных страниц."""
+    return Post.objects.for_feed().filter(
+        trending__isnull=False
+    ).order_by('-trending__score', '-id')
+
+
+def groups(limit=None):
+    """Популярные группы одним запросом по индексу оценки."""
+    return GroupScore.objects.select_related('group').order_by(
+        '-score'
+    )[:limit or settings.TRENDING_GROUPS_SHOWN]
+
+
+class TrendingPaginator(CursorPaginator):
+    """Курсорная пагинация популярного по ключу (оценка, id).
+
+    Страница читается из таблицы оценок по её индексу. Оценки растут
+    и после compact() пересчитываются, поэтому между страницами пост
+    может сдвинуться; для такой ленты это допустимо.
+    """
+    entry_key = ('score', 'post_id')
+
+    def encode(self, post):
+        return pack_cursor(repr(post.trending_score), post.pk)
+
+    def decode(self, token):
+        try:
+            score, pk = unpack_cursor(token)
+            return float(score), int(pk)
+        except (TypeError, ValueError):
+            return None
+
+    def fetch(self, score, pk, forward=True):
+        entries = self.seek(
+            PostScore.objects.all(), score, pk, forward, key=self.entry_key
+        ).select_related('post__author', 'post__group').only(
+            'score', 'post',
+            *(f'post__{field}' for field in PostQuerySet.FEED_FIELDS),
+            'post__author', 'post__group',
+        )
+        items = []
+        for entry in entries[:self.per_page + 1]:
+            entry.post.trending_score = entry.score
+            items.append(entry.post)
+        return items
@@ -1,38 +1,57 @@
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.views.decorators.http import require_POST
 
-from .forms import PostForm, CommentForm
-from .models import Post, Group, Comment, Follow
+from core.paginator import CursorPaginator, paginate
 
-
-User = get_user_model()
+from . import export, feeds, follows, graph, recommendations, trending
+from .forms import BulkFollowForm, PostForm, CommentForm
+from .models import (
+    AuthorStats, Post, Group, Comment, Follow, cached_users
+)
+from .search import SearchPaginator, get_backend
+from .timeline import TimelinePaginator
+from .trending import TrendingPaginator
 
 
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.select_related('group').all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
-        'page_number': page_number,
+        'feed': feeds.INDEX,
         'index': True,
     }
     return render(request, template, context)
 
 
+def trending_index(request):
+    template = 'posts/index.html'
+    page_obj = paginate(
+        request, trending.posts(), paginator_class=TrendingPaginator
+    )
+    context = {
+        'page_obj': page_obj,
+        'feed': feeds.TRENDING,
+        'trending': True,
+        'refresh': trending.refresh_key(),
+        'groups': trending.groups(),
+    }
+    return render(request, template, context)
+
+
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group).all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = get_object_or_404(Group.cached, slug=slug)
+    post_list = Post.objects.for_feed().filter(group=group)
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
+        'feed': feeds.group(group.pk),
         'group': group,
     }
     return render(request, template, context)
@@ -40,35 +59,98 @@ def group_posts(request, slug):
 
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    author_posts = Post.objects.filter(author=author)
-    paginator = Paginator(author_posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(cached_users, username=username)
+    author_posts = Post.objects.for_feed().filter(author=author)
+    page_obj = paginate(
+        request, author_posts, estimate=lambda: posts_count(author)
+    )
     following = False
+    recommended = []
     if request.user.is_authenticated:
-        following = request.user.follower.filter(author=author).exists()
+        following = graph.is_following(request.user.pk, author.pk)
+        recommended = recommendations.for_user(request.user.pk)
     context = {
         'page_obj': page_obj,
+        'feed': feeds.author(author.pk),
         'author': author,
         'following': following,
+        'recommendations': recommended,
     }
     return render(request, template, context)
 
 
+def posts_count(author):
+    try:
+        return author.stats.posts_count
+    except AuthorStats.DoesNotExist:
+        return None
+
+
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.cached, id=post_id)
+    trending.record_view(post.pk)
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post).all()
     context = {
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': comments_page(request, post),
+    }
+    return render(request, template, context)
+
+
+def comments_page(request, post):
+    comment_list = Comment.objects.filter(post=post).select_related(
+        'author'
+    ).only('text', 'created', 'author', 'author__username')
+    paginator = CursorPaginator(comment_list, settings.COMMENTS_PER_PAGE)
+    return paginator.cursor_page(after=request.GET.get('after'))
+
+
+def post_comments(request, post_id):
+    template = 'posts/includes/comment_list.html'
+    post = get_object_or_404(Post.cached, id=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post),
     }
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        paginator = SearchPaginator(
+            Post.objects.for_feed(), settings.POSTS_PER_PAGE, query=query
+        )
+        page_obj = paginator.cursor_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, template, context)
+
+
+@staff_member_required
+def export_posts(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in export.CONTENT_TYPES:
+        raise Http404
+    post_list = Post.objects.all()
+    if request.GET.get('author'):
+        post_list = post_list.filter(author__username=request.GET['author'])
+    if request.GET.get('group'):
+        post_list = post_list.filter(group__slug=request.GET['group'])
+    if request.GET.get('q'):
+        post_list = get_backend().filter(post_list, request.GET['q'])
+    return export.response(post_list, fmt)
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -90,7 +172,7 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.cached, id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post.id)
     form = PostForm(
@@ -99,7 +181,10 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        # Только поля формы: полный UPDATE вернул бы comment_count
+        # и миниатюры из копии поста, прочитанной в начале запроса.
+        post = form.save(commit=False)
+        post.save(update_fields=form.Meta.fields)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -111,7 +196,7 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.cached, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -124,21 +209,22 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(
+        request, Post.objects.for_feed(),
+        paginator_class=TimelinePaginator, user=request.user,
+    )
     context = {
         'page_obj': page_obj,
-        'page_number': page_number,
+        'feed': [feeds.follow(request.user.pk), feeds.CELEBRITIES],
         'follow': True,
+        'recommendations': recommendations.for_user(request.user.pk),
     }
     return render(request, template, context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(cached_users, username=username)
     if author != request.user:
         Follow.objects.get_or_create(
             user=request.user,
@@ -149,7 +235,7 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(cached_users, username=username)
     Follow.objects.filter(
         user=request.user,
         author=author,
@@ -158,3 +244,23 @@ def profile_unfollow(request, username):
         'posts:profile',
         author.username
     )
+
+
+def bulk_follow_response(request, action):
+    form = BulkFollowForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    results = action(request.user, form.cleaned_data['usernames'])
+    return JsonResponse({'results': results})
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    return bulk_follow_response(request, follows.follow_many)
+
+
+@login_required
+@require_POST
+def unfollow_bulk(request):
+    return bulk_follow_response(request, follows.unfollow_many)
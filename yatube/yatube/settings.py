@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,7 +44,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +66,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Тестовая база в файле, а не в памяти: так воркер очереди
+        # в тестах работает с блокировками SQLite, как в проекте.
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
     }
 }
 
@@ -100,11 +108,82 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# Выборки больше этого в режиме ?page= не считаются точно,
+# а точный подсчёт большой выборки кешируется на столько секунд.
+PAGINATOR_EXACT_COUNT_LIMIT = 10000
+PAGINATOR_COUNT_CACHE_TIMEOUT = 60 * 10
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BATCH_SIZE = 1000
+# Сколько секунд живёт в кеше список популярных авторов.
+TIMELINE_CELEBRITIES_TIMEOUT = 60 * 60
+# Сколько авторов можно подписать или отписать одним запросом.
+FOLLOW_BULK_LIMIT = 500
+# Граф подписок posts.graph: сколько массивов держит процесс
+# и сколько секунд они живут в общем кеше.
+FOLLOW_GRAPH_LOCAL_SIZE = 10000
+FOLLOW_GRAPH_TIMEOUT = 60 * 60
+# Сколько рекомендаций «кого почитать» показывать на странице.
+RECOMMENDATIONS_SHOWN = 5
+# Популярное (posts.trending): вес события падает вдвое
+# за TRENDING_HALF_LIFE секунд.
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_WEIGHTS = {'view': 1, 'comment': 5, 'follow': 10}
+# Оценки ниже этой compact_trending удаляет. Сжатие запускается
+# и само, когда epoch оценок старше TRENDING_COMPACT_INTERVAL.
+TRENDING_MIN_SCORE = 0.5
+TRENDING_COMPACT_INTERVAL = 60 * 60
+# Кеш ленты популярного обновляется раз в столько секунд.
+TRENDING_REFRESH_INTERVAL = 60
+# Просмотры уходят в базу пачкой из стольких штук или раз
+# в столько секунд.
+TRENDING_VIEW_BATCH = 100
+TRENDING_VIEW_INTERVAL = 10
+TRENDING_GROUPS_SHOWN = 5
+# Путь к классу из posts.search; None - выбрать по движку базы.
+SEARCH_BACKEND = None
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+THUMBNAIL_SIZES = {
+    'card': {'geometry': '960x339', 'widths': (320, 640, 960)},
+}
+# Форматы для <source>; без поддержки в Pillow пропускаются.
+# JPEG строится всегда и идёт в <img>.
+THUMBNAIL_FORMATS = ('avif', 'webp')
+THUMBNAIL_QUALITY = 80
+
+# Фоновые задачи core.tasks. В режиме TASKS_EAGER они выполняются
+# сразу в запросе, иначе очередь разбирает manage.py run_worker.
+TASKS_EAGER = DEBUG
+TASK_MAX_ATTEMPTS = 5
+# Пауза перед повтором в секундах удваивается с каждой попыткой.
+TASK_RETRY_BACKOFF = 2
+TASK_RETRY_BACKOFF_MAX = 60 * 10
+# Через столько секунд задача упавшего воркера снова попадает в очередь.
+TASK_LOCK_TIMEOUT = 60 * 5
+TASK_WORKER_CONCURRENCY = 4
+TASK_POLL_INTERVAL = 1
+
+# Кеш общий для всех процессов: поколения лент, объекты, граф подписок
+# и счётчики меняют не только веб-сервер, но и воркер очереди
+# и команды (warm_thumbnails, seed_yatube, import_posts). Кеш в памяти
+# процесса (LocMemCache) для этого не подходит. Файловый кеш хорош
+# для одной машины, в продакшене - memcached:
+# 'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+# 'LOCATION': '127.0.0.1:11211'.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
+OBJECT_CACHE_TIMEOUT = 60 * 60
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Server-Timing и лог метрик запроса; доля измеряемых запросов
+# и порог медленного запроса в миллисекундах.
+REQUEST_METRICS_ENABLED = True
+REQUEST_METRICS_SAMPLE_RATE = 0.1
+REQUEST_METRICS_SLOW_MS = 500